@@ -1,67 +1,228 @@
-import sys, os, json, shutil, uuid, time, pathlib
-from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Tuple
-
-from PySide6.QtCore import Qt, QRectF, QPointF, Signal, QUrl, QObject
+import sys, os, json, math, shutil, subprocess, tempfile, uuid, time, weakref, hashlib, importlib.util, base64, zlib
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field, fields
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from PySide6.QtCore import (
+    Qt, QRectF, QPointF, Signal, QUrl, QObject, QTimer, QRunnable, QThreadPool, QCoreApplication, QEvent,
+    QMimeData
+)
 from PySide6.QtGui import (
-    QAction, QBrush, QColor, QFont, QGuiApplication, QKeySequence, QPixmap, QPen,
-    QDesktopServices, QIcon, QImage
+    QAction, QColor, QFont, QGuiApplication, QKeySequence, QPixmap, QPen, QPainter,
+    QDesktopServices, QIcon, QImage, QImageReader, QImageWriter, QPalette
 )
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QStatusBar, QLabel, QToolBar, QStyle,
-    QGraphicsView, QGraphicsScene, QGraphicsRectItem, QGraphicsTextItem,
+    QGraphicsView, QGraphicsScene, QGraphicsItem, QGraphicsRectItem, QGraphicsTextItem,
     QGraphicsPixmapItem, QGraphicsProxyWidget, QMenu, QToolButton, QWidget,
     QHBoxLayout, QPushButton, QSlider, QMessageBox
 )
-from PySide6.QtMultimedia import QMediaPlayer, QAudioOutput
 
 # ------------------ Tema oscuro ------------------
+# qdarkstyle (y qtpy) se importan al aplicar el tema, no al cargar el módulo
 try:
-    import qdarkstyle
-    QDARKSTYLE_OK = True
+    QDARKSTYLE_OK = importlib.util.find_spec("qdarkstyle") is not None
 except Exception:
     QDARKSTYLE_OK = False
 
+def dark_stylesheet(app: QApplication) -> str:
+    import qdarkstyle
+    # La hoja generada se cachea en disco por versión de qdarkstyle / PySide6 / SO
+    from PySide6 import __version__ as pyside_version
+    path = os.path.join(APP_DIR, "cache", f"qdarkstyle-{qdarkstyle.__version__}-{pyside_version}-{sys.platform}.qss")
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            qss = f.read()
+    except OSError:
+        qss = qdarkstyle.load_stylesheet(qt_api="pyside6")
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                f.write(qss)
+            os.replace(path + ".tmp", path)
+        except OSError:
+            pass
+        return qss
+    # Desde caché sólo faltan los recursos (iconos) y el parche de paleta de qdarkstyle
+    os.environ["QT_API"] = "pyside6"
+    importlib.import_module("qdarkstyle.dark.darkstyle_rc")  # registra los recursos Qt al importarse
+    from qdarkstyle.dark.palette import DarkPalette
+    pal = app.palette()
+    pal.setColor(QPalette.Normal, QPalette.Link, QColor(DarkPalette.COLOR_ACCENT_3))
+    app.setPalette(pal)
+    return qss
+
+# ------------------ JSON rápido ------------------
+try:
+    import orjson
+    ORJSON_OK = True
+except Exception:
+    ORJSON_OK = False
+
+# Sin orjson: un único encoder configurado (los datos son árboles, sin ciclos que vigilar)
+_JSON_ENCODE = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), check_circular=False).encode
+
+def json_dumps(obj) -> bytes:
+    if ORJSON_OK:
+        return orjson.dumps(obj)
+    return _JSON_ENCODE(obj).encode("utf-8")
+
+def json_loads(data):
+    if ORJSON_OK:
+        return orjson.loads(data)
+    return json.loads(data)
+
+# ------------------ Viewport OpenGL ------------------
+try:
+    from PySide6.QtGui import QOpenGLContext
+    from PySide6.QtOpenGLWidgets import QOpenGLWidget
+    OPENGL_OK = True
+except Exception:
+    OPENGL_OK = False
+
+def opengl_usable() -> bool:
+    # Sin contexto GL real (drivers rotos, RDP, offscreen) el viewport quedaría en blanco
+    if not OPENGL_OK:
+        return False
+    try:
+        return QOpenGLContext().create()
+    except Exception:
+        return False
+
 # ------------------ Storage ------------------
 APP_DIR = os.path.join(os.environ.get("APPDATA", os.path.expanduser("~")), "WhiteBoard")
-AUTOSAVE_JSON = os.path.join(APP_DIR, "last.json")
+AUTOSAVE_JSON = os.path.join(APP_DIR, "last.json")  # formato antiguo: todo el proyecto en un fichero
+INDEX_JSON = os.path.join(APP_DIR, "index.json")
+BOARDS_DIR = os.path.join(APP_DIR, "boards")         # una pizarra por fichero: <board_id>.json
+JOURNAL_JSONL = os.path.join(APP_DIR, "journal.jsonl")  # cambios por nota desde la última compactación
 ASSETS_DIR = os.path.join(APP_DIR, "assets")
 os.makedirs(ASSETS_DIR, exist_ok=True)
 
+IMAGE_EXTS = frozenset({".png", ".jpg", ".jpeg", ".gif", ".webp"})
+AUDIO_EXTS = frozenset({".mp3", ".wav"})
+
 def new_id() -> str:
     return uuid.uuid4().hex
 
+def new_ids(n: int) -> List[str]:
+    # n ids aleatorios de 128 bits con una sola lectura de os.urandom
+    raw = os.urandom(16 * n)
+    return [raw[i:i + 16].hex() for i in range(0, 16 * n, 16)]
+
+# (ruta, tamaño, mtime) -> digest: un fichero sin cambios no se vuelve a leer
+_FILE_DIGESTS: Dict[Tuple[str, int, int], str] = {}
+
+def file_digest(path: str) -> str:
+    st = os.stat(path)
+    key = (path, st.st_size, st.st_mtime_ns)
+    digest = _FILE_DIGESTS.get(key)
+    if digest is None:
+        h = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        digest = _FILE_DIGESTS[key] = h.hexdigest()
+    return digest
+
 def copy_into_assets(src_path: str) -> str:
     try:
         if not src_path:
             return ""
         src_path = os.path.normpath(src_path)
-        if not os.path.exists(src_path):
-            return ""
-        ext = pathlib.Path(src_path).suffix.lower()
-        rel = f"{new_id()}{ext}"
-        shutil.copy2(src_path, os.path.join(ASSETS_DIR, rel))
+        if os.path.dirname(os.path.abspath(src_path)) == os.path.abspath(ASSETS_DIR):
+            return os.path.basename(src_path) if os.path.isfile(src_path) else ""
+        ext = os.path.splitext(src_path)[1].lower()
+        # Nombre por contenido: el mismo fichero importado dos veces comparte asset
+        rel = f"{file_digest(src_path)}{ext}"
+        dst = os.path.join(ASSETS_DIR, rel)
+        if not os.path.exists(dst):
+            # Temporal propio por copia: dos importaciones del mismo contenido pueden ir en paralelo
+            fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=ASSETS_DIR)
+            os.close(fd)
+            try:
+                # copyfile usa la copia en kernel del SO (sendfile / CopyFileEx) y no toca metadatos
+                shutil.copyfile(src_path, tmp)
+                os.replace(tmp, dst)
+            except OSError:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                if not os.path.exists(dst):  # otra copia pudo dejarlo ya en su sitio
+                    raise
         return rel
+    except FileNotFoundError:
+        return ""
     except Exception as e:
         print("[assets] copy error:", e)
         return ""
 
+SNAPSHOT_QUALITY = 70  # JPEG: calidad; PNG: compresión rápida
+
 def save_qimage_into_assets(img: QImage, ext: str = ".png") -> str:
     try:
         rel = f"{new_id()}{ext}"
         abs_path = os.path.join(ASSETS_DIR, rel)
-        img.save(abs_path)
+        w = QImageWriter(abs_path, ext.lstrip(".").encode())
+        # En PNG la calidad regula el deflate: 70 ≈ nivel zlib 2-3, sin pérdida y mucho más rápido
+        w.setQuality(SNAPSHOT_QUALITY)
+        if not w.write(img):
+            print("[assets] save_qimage error:", w.errorString())
+            return ""
         return rel
     except Exception as e:
         print("[assets] save_qimage error:", e)
         return ""
 
+# Importación en segundo plano: hash + copia fuera del hilo de la GUI
+class _AssetCopyTask(QRunnable):
+    def __init__(self, importer: "AssetImporter", seq: int, kind: str, src_path: str, board_id: str, pos):
+        super().__init__()
+        self.importer, self.seq = importer, seq
+        self.kind, self.src_path, self.board_id, self.pos = kind, src_path, board_id, pos
+
+    def run(self):
+        rel = ""
+        try:
+            rel = copy_into_assets(self.src_path)
+        finally:
+            self.importer._done.emit(self.seq, (self.kind, rel, self.board_id, self.pos))
+
+class AssetImporter(QObject):
+    copied = Signal(str, str, str, object)  # tipo, asset ("" si falló), pizarra, posición
+    _done = Signal(int, object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(2)
+        # Las copias terminan en cualquier orden; se entregan en el de llegada
+        self._next_seq = self._emit_seq = 0
+        self._ready: Dict[int, tuple] = {}
+        self._done.connect(self._on_done)
+
+    def start(self, kind: str, src_path: str, board_id: str, pos=None):
+        self.pool.start(_AssetCopyTask(self, self._next_seq, kind, src_path, board_id, pos))
+        self._next_seq += 1
+
+    def _on_done(self, seq: int, result: tuple):
+        self._ready[seq] = result
+        while self._emit_seq in self._ready:
+            self.copied.emit(*self._ready.pop(self._emit_seq))
+            self._emit_seq += 1
+
+    def wait(self):
+        self.pool.waitForDone()
+
 def open_in_explorer(abs_path: str):
     try:
         if not abs_path or not os.path.exists(abs_path):
             return
+        # Sin shell intermedio (cmd.exe) ni problemas de comillas
         if sys.platform.startswith("win"):
-            os.system(f'explorer /select,"{abs_path}"')
+            subprocess.Popen(["explorer", f"/select,{abs_path}"])
+        elif sys.platform == "darwin":
+            subprocess.Popen(["open", "-R", abs_path])
         else:
             QDesktopServices.openUrl(QUrl.fromLocalFile(os.path.dirname(abs_path)))
     except Exception as e:
@@ -74,14 +235,22 @@ def _runtime_base_dir() -> str:
         return base
     return os.path.dirname(os.path.abspath(sys.argv[0]))
 
+_ASSET_RESOLVE_CACHE: Dict[str, str] = {}
+
 def find_runtime_asset(rel_path: str) -> Optional[str]:
+    # Lo ya resuelto cuesta un solo stat; sólo se vuelve a sondear si el fichero desapareció
+    hit = _ASSET_RESOLVE_CACHE.get(rel_path)
+    if hit and os.path.exists(hit):
+        return hit
     candidates = [
         os.path.join(ASSETS_DIR, rel_path),
         os.path.join(_runtime_base_dir(), "assets", rel_path),
     ]
     for p in candidates:
-        if os.path.exists(p):
+        if p != hit and os.path.exists(p):
+            _ASSET_RESOLVE_CACHE[rel_path] = p
             return p
+    _ASSET_RESOLVE_CACHE.pop(rel_path, None)
     return None
 
 def _build_multisize_icon_from(path: str) -> QIcon:
@@ -103,7 +272,7 @@ def set_app_icon(app: QApplication):
         app.setWindowIcon(_build_multisize_icon_from(png_path))
 
 # ------------------ Modelo ------------------
-@dataclass
+@dataclass(slots=True)
 class NotePayload:
     title: str = ""     # IDEA
     subtitle: str = ""  # IDEA
@@ -112,8 +281,15 @@ class NotePayload:
     audio_asset: str = ""
     image_asset: str = ""
     volume: int = 100
+    # Dict serializado en caché; cualquier asignación lo invalida
+    _ser: Optional[dict] = field(default=None, init=False, repr=False, compare=False)
 
-@dataclass
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name != "_ser":
+            object.__setattr__(self, "_ser", None)
+
+@dataclass(slots=True)
 class Note:
     id: str
     type: str  # "idea" | "texto" | "audio" | "image"
@@ -122,97 +298,269 @@ class Note:
     z: int = 0
     child_board_id: Optional[str] = None
     payload: NotePayload = field(default_factory=NotePayload)
+    _ser: Optional[dict] = field(default=None, init=False, repr=False, compare=False)
 
-@dataclass
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name != "_ser":
+            object.__setattr__(self, "_ser", None)
+
+@dataclass(slots=True)
 class Board:
     id: str
     title: str = "Pizarra"
-    items_order: List[str] = field(default_factory=list)
-    items: Dict[str, Note] = field(default_factory=dict)
+    items: Dict[str, Note] = field(default_factory=dict)  # en orden de apilado
+    seq: int = 0  # último registro del diario ya incluido en la pizarra
 
-@dataclass
+@dataclass(slots=True)
 class Project:
     version: int
     project_id: str
     root_board_id: str
     boards: Dict[str, Board]
     last_opened: float = float(time.time())
+    journal_seq: int = 0  # contador de registros del diario (no se guarda en el índice)
+
+PAYLOAD_FIELDS = frozenset(f.name for f in fields(NotePayload) if f.init)
 
 def empty_project() -> Project:
     root_id = new_id()
     root = Board(id=root_id, title="Raíz")
     return Project(version=9, project_id=new_id(), root_board_id=root_id, boards={root_id: root})
 
-def save_project(p: Project, path: str = AUTOSAVE_JSON) -> None:
-    os.makedirs(APP_DIR, exist_ok=True)
-    serial = {
-        "version": p.version,
-        "project_id": p.project_id,
-        "root_board_id": p.root_board_id,
-        "last_opened": time.time(),
-        "boards": {},
-    }
-    for bid, b in p.boards.items():
-        serial["boards"][bid] = {
-            "id": b.id,
-            "title": b.title,
-            "items_order": b.items_order,
-            "items": {},
+# Los dicts devueltos se comparten entre guardados: tratarlos como inmutables
+def payload_to_dict(p: NotePayload) -> dict:
+    d = p._ser
+    if d is None:
+        d = p._ser = {
+            "title": p.title,
+            "subtitle": p.subtitle,
+            "body": p.body,
+            "font_pt": p.font_pt,
+            "audio_asset": p.audio_asset,
+            "image_asset": p.image_asset,
+            "volume": p.volume,
         }
-        for nid, n in b.items.items():
-            serial["boards"][bid]["items"][nid] = {
-                "id": n.id,
-                "type": n.type,
-                "pos": list(n.pos),
-                "size": list(n.size),
-                "z": n.z,
-                "child_board_id": n.child_board_id if n.type == "idea" else None,
-                "payload": {
-                    "title": n.payload.title,
-                    "subtitle": n.payload.subtitle,
-                    "body": n.payload.body,
-                    "font_pt": n.payload.font_pt,
-                    "audio_asset": n.payload.audio_asset,
-                    "image_asset": n.payload.image_asset,
-                    "volume": n.payload.volume,
-                },
-            }
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(serial, f, ensure_ascii=False, indent=2)
-
-def load_project(path: str = AUTOSAVE_JSON) -> Project:
-    if not os.path.exists(path):
-        return empty_project()
-    with open(path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    boards: Dict[str, Board] = {}
-    for bid, bd in data["boards"].items():
-        items = {}
-        for nid, nd in bd["items"].items():
-            p = NotePayload(
-                title=nd["payload"].get("title", ""),
-                subtitle=nd["payload"].get("subtitle", ""),
-                body=nd["payload"].get("body", ""),
-                font_pt=int(nd["payload"].get("font_pt", 12)),
-                audio_asset=nd["payload"].get("audio_asset", ""),
-                image_asset=nd["payload"].get("image_asset", ""),
-                volume=int(nd["payload"].get("volume", 100)),
-            )
-            items[nid] = Note(
-                id=nd["id"],
-                type=nd["type"],
-                pos=tuple(nd["pos"]),
-                size=tuple(nd["size"]),
-                z=int(nd["z"]),
-                child_board_id=nd.get("child_board_id") if nd["type"] == "idea" else None,
-                payload=p,
-            )
-        boards[bid] = Board(
-            id=bd["id"],
-            title=bd.get("title", "Pizarra"),
-            items_order=bd.get("items_order", list(items.keys())),
-            items=items,
-        )
+    return d
+
+def payload_from_dict(pd: dict) -> NotePayload:
+    # Las claves desconocidas (de versiones futuras) se ignoran
+    if pd.keys() <= PAYLOAD_FIELDS:
+        return NotePayload(**pd)
+    return NotePayload(**{k: v for k, v in pd.items() if k in PAYLOAD_FIELDS})
+
+def _note_to_dict(n: Note) -> dict:
+    pd = payload_to_dict(n.payload)
+    d = n._ser
+    if d is None or d["payload"] is not pd:
+        d = n._ser = {
+            "id": n.id,
+            "type": n.type,
+            "pos": n.pos,
+            "size": n.size,
+            "z": n.z,
+            "child_board_id": n.child_board_id if n.type == "idea" else None,
+            "payload": pd,
+        }
+    return d
+
+def _note_from_dict(nd: dict) -> Note:
+    # Internado: las comparaciones con los literales ("idea", ...) se resuelven por identidad
+    ntype = sys.intern(nd["type"])
+    is_idea = ntype == "idea"
+    return Note(
+        id=nd["id"],
+        type=ntype,
+        pos=tuple(nd["pos"]),
+        size=tuple(nd["size"]),
+        z=int(nd["z"]),
+        child_board_id=nd.get("child_board_id") if is_idea else None,
+        payload=payload_from_dict(nd["payload"]),
+    )
+
+def _board_to_dict(b: Board) -> dict:
+    return {
+        "id": b.id,
+        "title": b.title,
+        "items_order": list(b.items),  # redundante: se mantiene para versiones anteriores
+        "items": {nid: _note_to_dict(n) for nid, n in b.items.items()},
+        "seq": b.seq,
+    }
+
+def _board_from_dict(bd: dict) -> Board:
+    items_d = bd["items"]
+    # El orden lo da items_order si existe; ids huérfanos se descartan y los que falten van al final
+    order = [nid for nid in bd.get("items_order", ()) if nid in items_d]
+    if len(order) != len(items_d):
+        seen = set(order)
+        order += [nid for nid in items_d if nid not in seen]
+    return Board(
+        id=bd["id"],
+        title=bd.get("title", "Pizarra"),
+        items={nid: _note_from_dict(items_d[nid]) for nid in order},
+        seq=int(bd.get("seq", 0)),
+    )
+
+# Huella de lo último escrito/leído por fichero: lo idéntico no se reescribe
+_WRITTEN_DIGESTS: Dict[str, bytes] = {}
+
+def _digest(data: bytes) -> bytes:
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+def _write_json_atomic(path: str, obj) -> bool:
+    data = json_dumps(obj)
+    digest = _digest(data)
+    if _WRITTEN_DIGESTS.get(path) == digest:
+        return False
+    tmp = path + ".tmp"
+    # Escritura directa del buffer completo + fsync: sin copias intermedias ni ficheros a medias
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    os.replace(tmp, path)
+    _WRITTEN_DIGESTS[path] = digest
+    return True
+
+def _board_path(bid: str) -> str:
+    return os.path.join(BOARDS_DIR, f"{bid}.json")
+
+def _append_journal(records: List[dict]) -> None:
+    data = b"".join(json_dumps(r) + b"\n" for r in records)
+    fd = os.open(JOURNAL_JSONL, os.O_WRONLY | os.O_CREAT | os.O_APPEND | getattr(os, "O_BINARY", 0), 0o644)
+    # Sin fsync: el volcado lo decide el SO. Un corte pierde como mucho la cola, y una línea
+    # a medias se descarta al reproducir; la compactación sí deja las pizarras en disco antes de borrarlo
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+def _truncate_journal() -> None:
+    try:
+        os.remove(JOURNAL_JSONL)
+    except FileNotFoundError:
+        pass
+
+def _replay_journal(boards: Dict[str, Board]) -> Tuple[int, Set[str]]:
+    # Sólo se aplican registros posteriores al último volcado completo de su pizarra (seq)
+    last_seq, touched = 0, set()
+    try:
+        f = open(JOURNAL_JSONL, "rb")
+    except FileNotFoundError:
+        return last_seq, touched
+    with f:
+        for line in f:
+            try:
+                r = json_loads(line)
+            except ValueError:
+                break  # última línea a medias tras un corte
+            seq, nd = r["seq"], r["n"]
+            last_seq = max(last_seq, seq)
+            b = boards.get(r["b"])
+            if b is None or seq <= b.seq or nd["id"] not in b.items:
+                continue
+            b.items[nd["id"]] = _note_from_dict(nd)
+            b.seq = seq
+            touched.add(b.id)
+    return last_seq, touched
+
+def snapshot_project(p: Project, dirty: Optional[Iterable[str]] = None,
+                     journal: Iterable[dict] = (), compact: bool = False) -> dict:
+    """Copia en dicts planos de las pizarras en `dirty` (todas si es None), del índice
+    y de los registros a añadir al diario; `compact` vacía el diario tras escribir."""
+    bids = list(p.boards) if dirty is None else list(dirty)
+    boards = {}
+    for bid in bids:
+        b = p.boards.get(bid)
+        boards[bid] = _board_to_dict(b) if b is not None else None
+    return {
+        "full": dirty is None,
+        "boards": boards,
+        "journal": list(journal),
+        "compact": compact,
+        "index": {
+            "version": p.version,
+            "project_id": p.project_id,
+            "root_board_id": p.root_board_id,
+            "last_opened": time.time(),
+            "boards": list(p.boards),
+        },
+    }
+
+def write_snapshot(snap: dict) -> None:
+    if snap["journal"]:
+        _append_journal(snap["journal"])
+    os.makedirs(BOARDS_DIR, exist_ok=True)
+    removed = []
+    written = False
+    for bid, bd in snap["boards"].items():
+        if bd is None:
+            removed.append(bid)
+        elif _write_json_atomic(_board_path(bid), bd):
+            written = True
+    if written or removed or snap["full"]:
+        # El índice va después de las pizarras: nunca apunta a un fichero aún no escrito
+        _write_json_atomic(INDEX_JSON, snap["index"])
+        for bid in removed:
+            _WRITTEN_DIGESTS.pop(_board_path(bid), None)
+            try:
+                os.remove(_board_path(bid))
+            except FileNotFoundError:
+                pass
+    if snap["compact"]:
+        _truncate_journal()
+
+def save_project(p: Project, dirty: Optional[Iterable[str]] = None, compact: bool = False) -> None:
+    write_snapshot(snapshot_project(p, dirty, compact=compact))
+
+# Fallos esperables al guardar: disco (OSError) o datos no serializables (TypeError/ValueError,
+# que cubren también orjson.JSONEncodeError). El resto son bugs y no se silencian.
+SAVE_ERRORS = (OSError, TypeError, ValueError)
+SAVE_ERROR_MSG = "Error guardando: %s"
+
+# Guardado en segundo plano: la instantánea se toma en el hilo de la GUI
+class _SaveTask(QRunnable):
+    def __init__(self, saver: "ProjectSaver", snap: dict):
+        super().__init__()
+        self.saver = saver
+        self.snap = snap
+
+    def run(self):
+        error = "error inesperado"
+        try:
+            write_snapshot(self.snap)
+            error = ""
+        except SAVE_ERRORS as e:
+            error = str(e) or e.__class__.__name__
+        finally:
+            # Siempre se avisa; un fallo no previsto además sale con su traza
+            self.saver.finished.emit(error)
+
+class ProjectSaver(QObject):
+    finished = Signal(str)  # "" si fue bien, si no el mensaje de error
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        # Un solo hilo: las escrituras nunca se solapan y respetan el orden
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+
+    def start(self, snap: dict):
+        self.pool.start(_SaveTask(self, snap))
+
+    def wait(self):
+        self.pool.waitForDone()
+
+def _load_legacy_project(path: str) -> Project:
+    with open(path, "rb") as f:
+        data = json_loads(f.read())
+    boards = {bid: _board_from_dict(bd) for bid, bd in data["boards"].items()}
     return Project(
         version=int(data.get("version", 9)),
         project_id=data.get("project_id", new_id()),
@@ -221,15 +569,243 @@ def load_project(path: str = AUTOSAVE_JSON) -> Project:
         last_opened=float(data.get("last_opened", time.time())),
     )
 
+def load_project() -> Project:
+    try:
+        with open(INDEX_JSON, "rb") as f:
+            data = json_loads(f.read())
+    except FileNotFoundError:
+        try:
+            # Migración única desde last.json al formato por pizarra
+            p = _load_legacy_project(AUTOSAVE_JSON)
+        except FileNotFoundError:
+            return empty_project()
+        save_project(p)
+        return p
+    boards: Dict[str, Board] = {}
+    for bid in data["boards"]:
+        try:
+            with open(_board_path(bid), "rb") as f:
+                raw = f.read()
+            boards[bid] = _board_from_dict(json_loads(raw))
+            _WRITTEN_DIGESTS[_board_path(bid)] = _digest(raw)
+        except FileNotFoundError:
+            print("[load] falta la pizarra", bid)
+    root_id = data["root_board_id"]
+    if root_id not in boards:
+        boards[root_id] = Board(id=root_id, title="Raíz")
+    last_seq, touched = _replay_journal(boards)
+    p = Project(
+        version=int(data.get("version", 9)),
+        project_id=data.get("project_id", new_id()),
+        root_board_id=data["root_board_id"],
+        boards=boards,
+        last_opened=float(data.get("last_opened", time.time())),
+        journal_seq=max([last_seq, *(b.seq for b in boards.values())]),
+    )
+    if last_seq:
+        # Compactación al abrir: lo recuperado del diario pasa a las pizarras
+        save_project(p, touched, compact=True)
+    return p
+
+# ------------------ Deshacer / rehacer ------------------
+@dataclass
+class Command:
+    label: str
+    do: Callable[[], None]
+    undo: Callable[[], None]
+    boards: Tuple[str, ...] = ()        # pizarras que modifica (se marcan sucias)
+    notes: Tuple[str, ...] = ()         # notas a re-sincronizar en la escena
+    merge_key: Optional[str] = None     # comandos seguidos con la misma clave se fusionan
+    stamp: float = field(default_factory=time.monotonic)
+
+    def apply(self):
+        self.do()
+
+    def inverse(self) -> "Command":
+        return Command(self.label, self.undo, self.do, self.boards, self.notes)
+
+class CommandStack:
+    MERGE_WINDOW = 0.5  # s
+
+    def __init__(self, limit: int = 200):
+        self.limit = limit
+        self.undo_stack: List[Command] = []
+        self.redo_stack: List[Command] = []
+
+    def push(self, cmd: Command):
+        self.redo_stack.clear()
+        top = self.undo_stack[-1] if self.undo_stack else None
+        if (top is not None and cmd.merge_key and top.merge_key == cmd.merge_key
+                and cmd.stamp - top.stamp <= self.MERGE_WINDOW):
+            # Se conserva el undo original y se adopta el último do
+            top.do = cmd.do
+            top.stamp = cmd.stamp
+            return
+        self.undo_stack.append(cmd)
+        if len(self.undo_stack) > self.limit:
+            del self.undo_stack[0]
+
+    def undo(self) -> Optional[Command]:
+        if not self.undo_stack:
+            return None
+        cmd = self.undo_stack.pop()
+        cmd.inverse().apply()
+        self.redo_stack.append(cmd)
+        return cmd
+
+    def redo(self) -> Optional[Command]:
+        if not self.redo_stack:
+            return None
+        cmd = self.redo_stack.pop()
+        cmd.apply()
+        self.undo_stack.append(cmd)
+        return cmd
+
+# ------------------ Caché de imágenes ------------------
+# LRU de pixmaps ya escalados por (asset, ancho, alto) y de los originales por asset;
+# un mismo asset al mismo tamaño se comparte entre notas. Límite por entradas y por memoria
+PIXMAP_CACHE_MAX = 128
+SOURCE_CACHE_MAX = 16
+PIXMAP_CACHE_BYTES = 128 * 1024 * 1024
+SOURCE_CACHE_BYTES = 256 * 1024 * 1024
+_PIXMAP_CACHE: "OrderedDict[Tuple[str, int, int], QPixmap]" = OrderedDict()
+_SOURCE_CACHE: "OrderedDict[str, QPixmap]" = OrderedDict()
+
+def _pixmap_bytes(pm: QPixmap) -> int:
+    return pm.width() * pm.height() * pm.depth() // 8
+
+def _lru_put(cache: OrderedDict, key, value, cap: int, max_bytes: int = 0):
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > cap:
+        cache.popitem(last=False)
+    if max_bytes:
+        # Pocas entradas: sumar en cada alta es más simple que llevar la cuenta
+        used = sum(_pixmap_bytes(pm) for pm in cache.values())
+        while used > max_bytes and len(cache) > 1:
+            used -= _pixmap_bytes(cache.popitem(last=False)[1])
+
+def _source_pixmap(asset: str) -> Optional[QPixmap]:
+    pm = _SOURCE_CACHE.get(asset)
+    if pm is not None:
+        _SOURCE_CACHE.move_to_end(asset)
+        return pm
+    # Un fichero ausente da un QPixmap nulo: no hace falta comprobarlo antes
+    pm = QPixmap(os.path.join(ASSETS_DIR, asset))
+    if pm.isNull():
+        return None
+    _lru_put(_SOURCE_CACHE, asset, pm, SOURCE_CACHE_MAX, SOURCE_CACHE_BYTES)
+    return pm
+
+def cached_asset_pixmap(asset: str, tw: int, th: int) -> Optional[QPixmap]:
+    key = (asset, tw, th)
+    pm = _PIXMAP_CACHE.get(key)
+    if pm is not None:
+        _PIXMAP_CACHE.move_to_end(key)
+    return pm
+
+def scaled_asset_pixmap(asset: str, tw: int, th: int) -> Optional[QPixmap]:
+    key = (asset, tw, th)
+    pm = cached_asset_pixmap(asset, tw, th)
+    if pm is not None:
+        return pm
+    src = _source_pixmap(asset)
+    if src is None:
+        return None
+    pm = src.scaled(tw, th, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+    _lru_put(_PIXMAP_CACHE, key, pm, PIXMAP_CACHE_MAX, PIXMAP_CACHE_BYTES)
+    return pm
+
+def live_scaled_pixmap(asset: str, tw: int, th: int, mode=Qt.SmoothTransformation) -> Optional[QPixmap]:
+    # Escalado de paso (arrastre de redimensionado): no ocupa la caché de tamaños
+    src = _source_pixmap(asset)
+    return src.scaled(tw, th, Qt.KeepAspectRatio, mode) if src is not None else None
+
+# Decodificación en segundo plano: QImageReader lee ya a la resolución final
+class _ImageLoadTask(QRunnable):
+    def __init__(self, loader: "ImageLoader", asset: str, tw: int, th: int):
+        super().__init__()
+        self.loader = loader
+        self.asset, self.tw, self.th = asset, tw, th
+
+    def run(self):
+        reader = QImageReader(os.path.join(ASSETS_DIR, self.asset))
+        reader.setAutoTransform(True)
+        size = reader.size()
+        if size.isValid():
+            reader.setScaledSize(size.scaled(self.tw, self.th, Qt.KeepAspectRatio))
+        self.loader.loaded.emit(self.asset, self.tw, self.th, reader.read())
+
+class ImageLoader(QObject):
+    loaded = Signal(str, int, int, QImage)
+
+    def __init__(self):
+        super().__init__()
+        self._waiters: Dict[Tuple[str, int, int], list] = {}
+        # Emitida desde el hilo de trabajo: llega encolada al hilo de la GUI
+        self.loaded.connect(self._deliver)
+
+    def request(self, asset: str, tw: int, th: int, item: "ImageNoteItem"):
+        key = (asset, tw, th)
+        waiters = self._waiters.get(key)
+        if waiters is None:
+            self._waiters[key] = [weakref.ref(item)]
+            QThreadPool.globalInstance().start(_ImageLoadTask(self, asset, tw, th))
+        else:
+            waiters.append(weakref.ref(item))
+
+    def _deliver(self, asset: str, tw: int, th: int, img: QImage):
+        key = (asset, tw, th)
+        ok = not img.isNull()
+        if ok:
+            _lru_put(_PIXMAP_CACHE, key, QPixmap.fromImage(img), PIXMAP_CACHE_MAX, PIXMAP_CACHE_BYTES)
+        for ref in self._waiters.pop(key, []):
+            item = ref()
+            if item is None:
+                continue
+            try:
+                item._pixmap_ready(key, ok)
+            except RuntimeError:
+                pass  # item ya destruido en C++
+
+_IMAGE_LOADER: Optional[ImageLoader] = None
+
+def image_loader() -> ImageLoader:
+    global _IMAGE_LOADER
+    if _IMAGE_LOADER is None:
+        _IMAGE_LOADER = ImageLoader()
+    return _IMAGE_LOADER
+
+# ------------------ Fuentes ------------------
+_FONT_CACHE: Dict[Tuple[str, int, bool], QFont] = {}
+
+def _font(pt: int, bold: bool = False, family: str = "") -> QFont:
+    key = (family, pt, bold)
+    f = _FONT_CACHE.get(key)
+    if f is None:
+        f = QFont(family) if family else QFont()
+        f.setPointSize(pt)
+        f.setBold(bold)
+        # Sin hinting ni subpíxel: el glifo no se reajusta a la rejilla en cada zoom
+        f.setHintingPreference(QFont.PreferNoHinting)
+        f.setStyleStrategy(QFont.StyleStrategy(QFont.PreferAntialias | QFont.NoSubpixelAntialias))
+        _FONT_CACHE[key] = f
+    return f
+
 # ------------------ Items base ------------------
+HANDLE_COLOR = QColor(180, 180, 180)
+
 class BaseNoteItem(QObject, QGraphicsRectItem):
+    HANDLE = 0  # lado del tirador de redimensionado; 0 = no redimensionable
     request_open_child = Signal(str)
     request_delete = Signal(str)
-    request_nest_into = Signal(str, str)
+    request_drop = Signal(str, QPointF)
     request_copy = Signal(str)
     request_cut = Signal(str)
     request_edit = Signal(str)
     request_dirty = Signal()
+    request_payload_edit = Signal(str, object, object)  # note_id, payload antes, payload después
+    request_moved = Signal(object)  # [(note_id, (pos, size) antes, (pos, size) después)]
 
     def __init__(self, note: Note):
         QObject.__init__(self)
@@ -244,15 +820,62 @@ class BaseNoteItem(QObject, QGraphicsRectItem):
             | QGraphicsRectItem.ItemSendsScenePositionChanges
         )
         self.setAcceptHoverEvents(True)
+        # Se blitea el contorno cacheado en vez de repintarlo en cada frame
+        self.setCacheMode(QGraphicsItem.DeviceCoordinateCache)
         self._hovering = False
+        self._syncing = False
+        self._text_dirty = False
+        self._press_geom: List[Tuple["BaseNoteItem", tuple, tuple]] = []
+
+    # Aplica al item los cambios hechos en el modelo (sin re-emitir dirty)
+    def sync_from_note(self):
+        self._syncing = True
+        try:
+            self._sync()
+        finally:
+            self._syncing = False
+
+    # Vuelca al modelo el texto tecleado desde el último volcado (ver MainWindow._commit_text_edits)
+    def commit_text(self):
+        pass
+
+    def _text_changed(self):
+        # Por tecla sólo se marca sucio; el toPlainText() se hace una vez, al volcar
+        if self._syncing or self._text_dirty:
+            return
+        self._text_dirty = True
+        self.request_dirty.emit()
+
+    def _sync(self):
+        n = self.note
+        if (self.pos().x(), self.pos().y()) != tuple(n.pos):
+            self.setPos(QPointF(n.pos[0], n.pos[1]))
+        if self.zValue() != n.z:
+            self.setZValue(n.z)
+
+    # Tirador de redimensionado (esquina inferior derecha) en coordenadas del item
+    def _handle_rect(self) -> QRectF:
+        r = self.rect()
+        h = self.HANDLE
+        return QRectF(r.right() - h, r.bottom() - h, h, h)
+
+    def _on_handle(self, scene_pos: QPointF) -> bool:
+        return bool(self.HANDLE) and self.isSelected() and self._handle_rect().contains(self.mapFromScene(scene_pos))
 
     # Contorno sólo visible al seleccionar/hover
     def paint(self, painter, option, widget=None):
         if self.isSelected() or self._hovering:
+            painter.save()
+            # Rectángulo alineado a ejes: el antialiasing no aporta nada
+            painter.setRenderHint(QPainter.Antialiasing, False)
             pen = QPen(QColor(160, 160, 160, 200), 1, Qt.DashLine)
             painter.setPen(pen)
             painter.setBrush(Qt.NoBrush)
             painter.drawRect(self.rect())
+            painter.restore()
+        if self.HANDLE and self.isSelected():
+            # Se pinta aquí en vez de ser un item hijo más en la escena
+            painter.fillRect(self._handle_rect(), HANDLE_COLOR)
 
     def hoverEnterEvent(self, e):
         self._hovering = True
@@ -265,7 +888,7 @@ class BaseNoteItem(QObject, QGraphicsRectItem):
         super().hoverLeaveEvent(e)
 
     def itemChange(self, change, value):
-        if change == QGraphicsRectItem.ItemPositionHasChanged:
+        if change == QGraphicsRectItem.ItemPositionHasChanged and not self._syncing:
             self.note.pos = (self.pos().x(), self.pos().y())
             self.request_dirty.emit()
         if change == QGraphicsRectItem.ItemSelectedHasChanged:
@@ -275,15 +898,33 @@ class BaseNoteItem(QObject, QGraphicsRectItem):
     def on_selected(self, selected: bool):
         pass
 
-    def mouseReleaseEvent(self, event):
+    # Un item "fijado" no se descarta aunque salga del viewport
+    def pinned(self) -> bool:
+        if self.isSelected():
+            return True
+        scene = self.scene()
+        fi = scene.focusItem() if scene else None
+        return fi is not None and (fi is self or self.isAncestorOf(fi))
+
+    def mousePressEvent(self, event):
+        super().mousePressEvent(event)
+        # Qt mueve toda la selección, pero sólo este item recibe press/release
         scene = self.scene()
-        if scene:
-            items = scene.items(event.scenePos())
-            for it in items:
-                if isinstance(it, BaseNoteItem) and it is not self and it.note.type == "idea":
-                    self.request_nest_into.emit(self.note.id, it.note.id)
-                    break
+        group = [self] + [it for it in (scene.selectedItems() if scene else [])
+                          if isinstance(it, BaseNoteItem) and it is not self]
+        self._press_geom = [(it, it.note.pos, it.note.size) for it in group]
+
+    def mouseReleaseEvent(self, event):
+        drop_pos = event.scenePos()
         super().mouseReleaseEvent(event)
+        moved = [(it.note.id, (pos, size), (it.note.pos, it.note.size))
+                 for it, pos, size in self._press_geom
+                 if (pos, size) != (it.note.pos, it.note.size)]
+        self._press_geom = []
+        if moved:
+            self.request_moved.emit(moved)
+        # Se emite al final: anidar saca este item de la escena
+        self.request_drop.emit(self.note.id, drop_pos)
 
     def _common_menu(self, with_open: bool):
         menu = QMenu()
@@ -304,45 +945,46 @@ class IdeaNoteItem(BaseNoteItem):
         self._resizing = False
 
         self.title_item = QGraphicsTextItem(note.payload.title, self)
-        f1 = QFont()
-        f1.setPointSize(12)
-        f1.setBold(True)
-        self.title_item.setFont(f1)
+        self.title_item.setFont(_font(12, bold=True))
         self.title_item.setDefaultTextColor(QColor("white"))
         self.title_item.setTextInteractionFlags(Qt.TextEditorInteraction)
         self.title_item.setPos(8, 8)
-        self.title_item.document().contentsChanged.connect(self._commit_and_dirty)
+        self.title_item.document().setUseDesignMetrics(True)
+        self.title_item.document().contentsChanged.connect(self._text_changed)
 
         self.subtitle_item = QGraphicsTextItem(note.payload.subtitle, self)
-        f2 = QFont()
-        f2.setPointSize(9)
-        self.subtitle_item.setFont(f2)
+        self.subtitle_item.setFont(_font(9))
         self.subtitle_item.setDefaultTextColor(QColor("#cccccc"))
         self.subtitle_item.setTextInteractionFlags(Qt.TextEditorInteraction)
         self.subtitle_item.setPos(8, 34)
-        self.subtitle_item.document().contentsChanged.connect(self._commit_and_dirty)
+        self.subtitle_item.document().contentsChanged.connect(self._text_changed)
 
-        self.handle = QGraphicsRectItem(self)
-        self._reposition_handle()
-        self.handle.setVisible(False)
 
-    def _commit_and_dirty(self):
+        # El texto es lo más caro de rasterizar: se cachea en coordenadas del item
+        for it in (self, self.title_item, self.subtitle_item):
+            it.setCacheMode(QGraphicsItem.ItemCoordinateCache)
+
+    def commit_text(self):
+        if not self._text_dirty:
+            return
+        self._text_dirty = False
+        old = payload_to_dict(self.note.payload)
         self.note.payload.title = self.title_item.toPlainText()
         self.note.payload.subtitle = self.subtitle_item.toPlainText()
-        self.request_dirty.emit()
-
-    def _reposition_handle(self):
-        r = self.rect()
-        self.handle.setRect(r.right() - self.HANDLE, r.bottom() - self.HANDLE, self.HANDLE, self.HANDLE)
-        self.handle.setBrush(QBrush(QColor(180, 180, 180)))
-        self.handle.setFlags(QGraphicsRectItem.ItemIgnoresTransformations)
-        self.handle.setZValue(self.zValue() + 1)
-
-    def on_selected(self, selected: bool):
-        self.handle.setVisible(selected)
+        self.request_payload_edit.emit(self.note.id, old, payload_to_dict(self.note.payload))
+
+    def _sync(self):
+        super()._sync()
+        n = self.note
+        if self.rect().size().toTuple() != tuple(n.size):
+            self.setRect(QRectF(0, 0, n.size[0], n.size[1]))
+        if self.title_item.toPlainText() != n.payload.title:
+            self.title_item.setPlainText(n.payload.title)
+        if self.subtitle_item.toPlainText() != n.payload.subtitle:
+            self.subtitle_item.setPlainText(n.payload.subtitle)
 
     def mousePressEvent(self, event):
-        self._resizing = self.handle.isVisible() and self.handle.contains(self.mapFromScene(event.scenePos()))
+        self._resizing = self._on_handle(event.scenePos())
         super().mousePressEvent(event)
 
     def mouseMoveEvent(self, event):
@@ -352,7 +994,6 @@ class IdeaNoteItem(BaseNoteItem):
             new_w = max(200, p.x() - tl.x())
             new_h = max(80, p.y() - tl.y())
             self.setRect(QRectF(0, 0, new_w, new_h))
-            self._reposition_handle()
             self.note.size = (new_w, new_h)
             self.request_dirty.emit()
         else:
@@ -383,58 +1024,80 @@ class TextoNoteItem(BaseNoteItem):
         super().__init__(note)
         self._resizing = False
         self._pad = 8
+        # Redimensionado: como mucho un relayout del texto por frame
+        self._pending_size: Optional[Tuple[float, float]] = None
+        self._resize_timer = QTimer(self)
+        self._resize_timer.setSingleShot(True)
+        self._resize_timer.setInterval(16)
+        self._resize_timer.timeout.connect(self._apply_pending_resize)
 
         self.body_item = QGraphicsTextItem(note.payload.body, self)
         self.body_item.setTextInteractionFlags(Qt.TextEditorInteraction)
         self.body_item.setDefaultTextColor(QColor("#eaeaea"))
-        f = QFont()
-        f.setPointSize(max(6, note.payload.font_pt))
-        self.body_item.setFont(f)
-        self.body_item.document().contentsChanged.connect(self._commit_and_dirty)
+        self.body_item.setFont(_font(max(6, note.payload.font_pt)))
+        self.body_item.document().contentsChanged.connect(self._text_changed)
         self._apply_text_width()
 
-        self.handle = QGraphicsRectItem(self)
-        self._reposition_handle()
-        self.handle.setVisible(False)
 
-    def _commit_and_dirty(self):
-        self.note.payload.body = self.body_item.toPlainText()
-        self.request_dirty.emit()
+        for it in (self, self.body_item):
+            it.setCacheMode(QGraphicsItem.ItemCoordinateCache)
 
-    def _reposition_handle(self):
-        r = self.rect()
-        self.handle.setRect(r.right() - self.HANDLE, r.bottom() - self.HANDLE, self.HANDLE, self.HANDLE)
-        self.handle.setBrush(QBrush(QColor(180, 180, 180)))
-        self.handle.setFlags(QGraphicsRectItem.ItemIgnoresTransformations)
-        self.handle.setZValue(self.zValue() + 1)
+    def commit_text(self):
+        if not self._text_dirty:
+            return
+        self._text_dirty = False
+        old = payload_to_dict(self.note.payload)
+        self.note.payload.body = self.body_item.toPlainText()
+        self.request_payload_edit.emit(self.note.id, old, payload_to_dict(self.note.payload))
+
+    def _sync(self):
+        super()._sync()
+        n = self.note
+        relayout = False
+        if self.rect().size().toTuple() != tuple(n.size):
+            self.setRect(QRectF(0, 0, n.size[0], n.size[1]))
+            relayout = True
+        if self.body_item.font().pointSize() != max(6, n.payload.font_pt):
+            self.body_item.setFont(_font(max(6, n.payload.font_pt)))
+            relayout = True
+        if self.body_item.toPlainText() != n.payload.body:
+            self.body_item.setPlainText(n.payload.body)
+        if relayout:
+            self._apply_text_width()
 
     def _apply_text_width(self):
         w = max(120, self.rect().width() - 2 * self._pad)
         self.body_item.setTextWidth(w)
         self.body_item.setPos(self._pad, self._pad)
 
-    def on_selected(self, selected: bool):
-        self.handle.setVisible(selected)
-
     def mousePressEvent(self, event):
-        self._resizing = self.handle.isVisible() and self.handle.contains(self.mapFromScene(event.scenePos()))
+        self._resizing = self._on_handle(event.scenePos())
         super().mousePressEvent(event)
 
     def mouseMoveEvent(self, event):
         if self._resizing:
             p = event.scenePos()
             tl = self.mapToScene(self.rect().topLeft())
-            new_w = max(160, p.x() - tl.x())
-            new_h = max(80, p.y() - tl.y())
-            self.setRect(QRectF(0, 0, new_w, new_h))
-            self._reposition_handle()
-            self._apply_text_width()
-            self.note.size = (new_w, new_h)
-            self.request_dirty.emit()
+            self._pending_size = (max(160, p.x() - tl.x()), max(80, p.y() - tl.y()))
+            if not self._resize_timer.isActive():
+                self._resize_timer.start()
         else:
             super().mouseMoveEvent(event)
 
+    def _apply_pending_resize(self):
+        if self._pending_size is None:
+            return
+        new_w, new_h = self._pending_size
+        self._pending_size = None
+        self.setRect(QRectF(0, 0, new_w, new_h))
+        self._apply_text_width()
+        self.note.size = (new_w, new_h)
+        self.request_dirty.emit()
+
     def mouseReleaseEvent(self, event):
+        if self._resizing:
+            self._resize_timer.stop()
+            self._apply_pending_resize()
         self._resizing = False
         super().mouseReleaseEvent(event)
 
@@ -464,11 +1127,12 @@ class TextoNoteItem(BaseNoteItem):
         QGuiApplication.clipboard().setText(txt)
 
     def _bump_font(self, delta: int):
-        f = self.body_item.font()
-        size = max(6, min(72, f.pointSize() + delta))
-        f.setPointSize(size)
-        self.body_item.setFont(f)
+        self.commit_text()
+        size = max(6, min(72, self.body_item.font().pointSize() + delta))
+        self.body_item.setFont(_font(size))
+        old = payload_to_dict(self.note.payload)
         self.note.payload.font_pt = size
+        self.request_payload_edit.emit(self.note.id, old, payload_to_dict(self.note.payload))
         self._apply_text_width()
         self.request_dirty.emit()
         self.update()
@@ -480,40 +1144,58 @@ class ImageNoteItem(BaseNoteItem):
     def __init__(self, note: Note):
         super().__init__(note)
         self._resizing = False
+        self._pending: Optional[Tuple[str, int, int]] = None
         self.pix_item = QGraphicsPixmapItem(self)
+        # La imagen va por debajo del contorno y el tirador que pinta la nota
+        self.pix_item.setFlag(QGraphicsItem.ItemStacksBehindParent)
         self._reload_pixmap()
-        self.handle = QGraphicsRectItem(self)
-        self._reposition_handle()
-        self.handle.setVisible(False)
 
-    def _reload_pixmap(self):
+    def _reload_pixmap(self, live: bool = False):
         pad = 4
-        if self.note.payload.image_asset:
-            abs_path = os.path.join(ASSETS_DIR, self.note.payload.image_asset)
-            if os.path.exists(abs_path):
-                pm = QPixmap(abs_path)
-                if not pm.isNull():
-                    target_w = max(64, int(self.note.size[0])) - 2 * pad
-                    target_h = max(64, int(self.note.size[1])) - 2 * pad
-                    scaled = pm.scaled(target_w, target_h, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-                    self.pix_item.setPixmap(scaled)
-                    self.setRect(QRectF(0, 0, scaled.width() + 2 * pad, scaled.height() + 2 * pad))
-                    self.pix_item.setPos(pad, pad)
-                    return
+        self._shown = (self.note.payload.image_asset, tuple(self.note.size))
+        self._pending = None
+        asset = self.note.payload.image_asset
+        if asset:
+            target_w = max(64, int(self.note.size[0])) - 2 * pad
+            target_h = max(64, int(self.note.size[1])) - 2 * pad
+            if live:
+                # Arrastre interactivo: escalado rápido (vecino más cercano) desde el original cacheado;
+                # el suavizado se hace una vez al soltar
+                scaled = live_scaled_pixmap(asset, target_w, target_h, Qt.FastTransformation)
+            else:
+                scaled = cached_asset_pixmap(asset, target_w, target_h)
+                if scaled is None and asset in _SOURCE_CACHE:
+                    # Original ya decodificado en memoria: sólo falta escalarlo
+                    scaled = scaled_asset_pixmap(asset, target_w, target_h)
+            if scaled is not None:
+                self.pix_item.setPixmap(scaled)
+                self.setRect(QRectF(0, 0, scaled.width() + 2 * pad, scaled.height() + 2 * pad))
+                self.pix_item.setPos(pad, pad)
+                return
+            if not live:
+                # Mientras se decodifica se reserva el tamaño de la nota
+                self._pending = (asset, target_w, target_h)
+                image_loader().request(asset, target_w, target_h, self)
+                self.setRect(QRectF(0, 0, self.note.size[0], self.note.size[1]))
+                return
         self.setRect(QRectF(0, 0, 180, 120))
 
-    def _reposition_handle(self):
-        r = self.rect()
-        self.handle.setRect(r.right() - self.HANDLE, r.bottom() - self.HANDLE, self.HANDLE, self.HANDLE)
-        self.handle.setBrush(QBrush(QColor(180, 180, 180)))
-        self.handle.setFlags(QGraphicsRectItem.ItemIgnoresTransformations)
-        self.handle.setZValue(self.zValue() + 1)
+    def _pixmap_ready(self, key: Tuple[str, int, int], ok: bool):
+        if key != self._pending:
+            return  # respuesta a una petición ya superada
+        self._pending = None
+        if ok:
+            self._reload_pixmap()
+        else:
+            self.setRect(QRectF(0, 0, 180, 120))
 
-    def on_selected(self, selected: bool):
-        self.handle.setVisible(selected)
+    def _sync(self):
+        super()._sync()
+        if (self.note.payload.image_asset, tuple(self.note.size)) != self._shown:
+            self._reload_pixmap()
 
     def mousePressEvent(self, event):
-        self._resizing = self.handle.isVisible() and self.handle.contains(self.mapFromScene(event.scenePos()))
+        self._resizing = self._on_handle(event.scenePos())
         super().mousePressEvent(event)
 
     def mouseMoveEvent(self, event):
@@ -523,14 +1205,16 @@ class ImageNoteItem(BaseNoteItem):
             new_w = max(64, p.x() - tl.x())
             new_h = max(64, p.y() - tl.y())
             self.note.size = (new_w, new_h)
-            self._reload_pixmap()
-            self._reposition_handle()
+            self._reload_pixmap(live=True)
             self.request_dirty.emit()
         else:
             super().mouseMoveEvent(event)
 
     def mouseReleaseEvent(self, event):
-        self._resizing = False
+        if self._resizing:
+            # Render definitivo (y cacheado) sólo para el tamaño final
+            self._resizing = False
+            self._reload_pixmap()
         super().mouseReleaseEvent(event)
 
     def contextMenuEvent(self, event):
@@ -555,6 +1239,8 @@ class ImageNoteItem(BaseNoteItem):
 class AudioWidget(QWidget):
     def __init__(self, abs_audio_path: str, init_volume: int = 100, parent=None):
         super().__init__(parent)
+        # QtMultimedia se carga con el primer reproductor, no al arrancar
+        from PySide6.QtMultimedia import QMediaPlayer, QAudioOutput
         self.player = QMediaPlayer(self)
         self.audio = QAudioOutput(self)
         self.player.setAudioOutput(self.audio)
@@ -575,24 +1261,49 @@ class AudioWidget(QWidget):
         self.player.playbackStateChanged.connect(self.on_state)
 
     def toggle(self):
-        if self.player.playbackState() == QMediaPlayer.PlayingState:
+        if self.is_playing():
             self.player.pause()
         else:
             self.player.play()
 
     def on_state(self, st):
-        self.btn.setText("Pause" if st == QMediaPlayer.PlayingState else "Play")
+        self.btn.setText("Pause" if st == self.player.PlayingState else "Play")
+
+    def is_playing(self) -> bool:
+        return self.player.playbackState() == self.player.PlayingState
 
 class AudioNoteItem(BaseNoteItem):
     def __init__(self, note: Note):
         super().__init__(note)
-        abs_path = os.path.join(ASSETS_DIR, note.payload.audio_asset) if note.payload.audio_asset else ""
-        self.widget = AudioWidget(abs_path, note.payload.volume)
+        # El reproductor se crea al primer Play; hasta entonces solo un botón
+        self.widget: Optional[AudioWidget] = None
+        self.stub = QPushButton("Play")
+        self.stub.clicked.connect(self._activate)
         self.proxy = QGraphicsProxyWidget(self)
-        self.proxy.setWidget(self.widget)
+        self.proxy.setWidget(self.stub)
         self.proxy.setPos(8, 8)
+        self._fit_rect()
+
+    def _fit_rect(self):
         self.setRect(QRectF(0, 0, max(260, self.proxy.size().width() + 16), max(90, self.proxy.size().height() + 16)))
 
+    def _activate(self):
+        abs_path = os.path.join(ASSETS_DIR, self.note.payload.audio_asset) if self.note.payload.audio_asset else ""
+        self.widget = AudioWidget(abs_path, self.note.payload.volume)
+        self.widget.vol.valueChanged.connect(self._volume_changed)
+        self.proxy.setWidget(self.widget)
+        self.stub.deleteLater()
+        self.stub = None
+        self._fit_rect()
+        self.widget.player.play()
+
+    def _volume_changed(self, v: int):
+        self.note.payload.volume = v
+        self.request_dirty.emit()
+
+    def pinned(self) -> bool:
+        return super().pinned() or (self.widget is not None and self.widget.is_playing())
+
     def contextMenuEvent(self, event):
         menu = QMenu()
         act_open = menu.addAction("Abrir ubicación")
@@ -611,12 +1322,25 @@ class AudioNoteItem(BaseNoteItem):
         elif chosen == act_cut:
             self.request_cut.emit(self.note.id)
 
+_NOTE_ITEM_TYPES: Dict[str, type] = {
+    "idea": IdeaNoteItem,
+    "texto": TextoNoteItem,
+    "image": ImageNoteItem,
+    "audio": AudioNoteItem,
+}
+
 # ------------------ Escena / Vista ------------------
 class BoardScene(QGraphicsScene):
     request_new_idea = Signal(QPointF)
     request_new_texto = Signal(QPointF)
     request_paste = Signal(QPointF)
 
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        # Con el culling la escena sólo tiene los items cercanos al viewport: mantener un BSP
+        # en cada arrastre cuesta más que recorrerlos
+        self.setItemIndexMethod(QGraphicsScene.NoIndex)
+
     def contextMenuEvent(self, event):
         item = self.itemAt(event.scenePos(), self.views()[0].transform()) if self.views() else None
         if not item:
@@ -637,13 +1361,27 @@ class BoardScene(QGraphicsScene):
 
 class BoardView(QGraphicsView):
     dropped_files = Signal(list)
+    viewport_resized = Signal()
 
     def __init__(self, scene: BoardScene, parent=None):
         super().__init__(scene, parent)
+        # Rasterizado en GPU (el viewport GL no admite repintado parcial: siempre completo);
+        # en raster sólo se repinta el rect que envuelve lo cambiado
+        if opengl_usable():
+            self.setViewport(QOpenGLWidget())
+            self.setViewportUpdateMode(QGraphicsView.FullViewportUpdate)
+        else:
+            self.setViewportUpdateMode(QGraphicsView.BoundingRectViewportUpdate)
+        self.setRenderHints(QPainter.TextAntialiasing)
+        self.setOptimizationFlag(QGraphicsView.DontAdjustForAntialiasing, True)
         self.setAcceptDrops(True)
         self.viewport().setAcceptDrops(True)
         self.setDragMode(QGraphicsView.RubberBandDrag)
 
+    def resizeEvent(self, e):
+        super().resizeEvent(e)
+        self.viewport_resized.emit()
+
     def dragEnterEvent(self, e):
         if e.mimeData().hasUrls():
             e.acceptProposedAction()
@@ -668,8 +1406,145 @@ class BoardView(QGraphicsView):
         except Exception as err:
             print("[drop] error:", err)
 
+def _note_rect(n: Note) -> QRectF:
+    return QRectF(n.pos[0], n.pos[1], n.size[0], n.size[1])
+
+# Geometría de una pizarra en columnas paralelas, de abajo a arriba (z, orden de items)
+@dataclass(slots=True)
+class BoardGeometry:
+    ids: List[str]
+    x0: array
+    y0: array
+    x1: array
+    y1: array
+    idea: array  # 1 si la nota es una idea
+
+    def bounds(self) -> QRectF:
+        if not self.ids:
+            return QRectF()
+        left, top = min(self.x0), min(self.y0)
+        return QRectF(left, top, max(self.x1) - left, max(self.y1) - top)
+
+def board_geometry(board: Board, order_index: Dict[str, int]) -> BoardGeometry:
+    notes = sorted(board.items.values(), key=lambda n: (n.z, order_index.get(n.id, 0)))
+    return BoardGeometry(
+        ids=[n.id for n in notes],
+        x0=array("d", [n.pos[0] for n in notes]),
+        y0=array("d", [n.pos[1] for n in notes]),
+        x1=array("d", [n.pos[0] + n.size[0] for n in notes]),
+        y1=array("d", [n.pos[1] + n.size[1] for n in notes]),
+        idea=array("b", [n.type == "idea" for n in notes]),
+    )
+
 # ------------------ MainWindow ------------------
+# copy_note escribe "whiteboard_clip" como primera clave
+CLIP_PREFIX = '{"whiteboard_clip"'
+# Clips grandes: JSON comprimido con zlib y en base64 tras este prefijo
+CLIP_ZPREFIX = "WBZ1:"
+CLIP_COMPRESS_MIN = 64 * 1024
+CLIP_MAX_BYTES = 32 * 1024 * 1024  # tope al descomprimir: un texto ajeno no puede inflarse sin límite
+
+def encode_clip(nodes: List[dict]) -> str:
+    raw = json_dumps({"whiteboard_clip": True, "nodes": nodes})
+    if len(raw) < CLIP_COMPRESS_MIN:
+        return raw.decode("utf-8")
+    return CLIP_ZPREFIX + base64.b64encode(zlib.compress(raw, 3)).decode("ascii")
+
+def decode_clip(text: str) -> Optional[dict]:
+    # None si el texto no es un clip nuestro; sólo se parsea lo que empieza como tal
+    if text.startswith(CLIP_ZPREFIX):
+        try:
+            d = zlib.decompressobj()
+            raw = d.decompress(base64.b64decode(text[len(CLIP_ZPREFIX):]), CLIP_MAX_BYTES)
+            if d.unconsumed_tail or not d.eof:
+                return None  # excede el tope o está truncado: no es un clip nuestro
+            return json_loads(raw)
+        except (ValueError, zlib.error):
+            return None
+    if not text[:64].lstrip().startswith(CLIP_PREFIX):
+        return None
+    try:
+        return json_loads(text)
+    except ValueError:
+        return None
+
+class ClipMimeData(QMimeData):
+    # Copia diferida: los nodos se capturan al copiar (los dicts cacheados no se mutan, sólo se
+    # reemplazan) y el JSON se genera la primera vez que alguien pide el texto
+    def __init__(self, nodes: List[dict]):
+        super().__init__()
+        self._nodes: Optional[List[dict]] = nodes
+        self._text: Optional[str] = None
+
+    def formats(self):
+        return ["text/plain"]
+
+    def hasFormat(self, mime: str) -> bool:
+        return mime == "text/plain"
+
+    def retrieveData(self, mime: str, type_):
+        if not mime.startswith("text/plain"):
+            return None
+        if self._text is None:
+            self._text = encode_clip(self._nodes)
+            self._nodes = None
+        return self._text
+
+def _flatten_clip_tree(root) -> List[dict]:
+    # Portapapeles anterior ({"note": ..., "children": [...]} anidado) a la lista plana con índices de padre;
+    # lista vacía si la forma no es la esperada
+    out: List[dict] = []
+    stack = [(root, -1)]
+    while stack:
+        node, parent = stack.pop()
+        note = node.get("note") if isinstance(node, dict) else None
+        children = (node.get("children") or []) if isinstance(node, dict) else None
+        if not isinstance(note, dict) or not isinstance(children, list):
+            return []
+        idx = len(out)
+        out.append(dict(note, parent=parent))
+        stack.extend((ch, idx) for ch in reversed(children))
+    return out
+
+_NUM = (int, float)
+
+def _finite(v) -> bool:
+    # json (sin orjson) acepta NaN/Infinity y int() falla con ellos
+    return isinstance(v, _NUM) and math.isfinite(v)
+_CLIP_STR_FIELDS = ("title", "subtitle", "body", "audio_asset", "image_asset")
+
+def valid_clip_nodes(nodes) -> bool:
+    # Chequeo estructural barato antes de crear nada: preorden con el padre siempre antes que el hijo
+    # y los campos que _paste_node convierte con el tipo esperado
+    if not isinstance(nodes, list) or not nodes:
+        return False
+    for i, node in enumerate(nodes):
+        if not isinstance(node, dict):
+            return False
+        parent, payload, size = node.get("parent"), node.get("payload"), node.get("size", (0, 0))
+        if type(parent) is not int or not -1 <= parent < i or (parent == -1) != (i == 0):
+            return False
+        if not isinstance(node.get("type"), str) or not isinstance(payload, dict):
+            return False
+        if not isinstance(size, (list, tuple)) or len(size) != 2 or not all(_finite(v) for v in size):
+            return False
+        if not _finite(node.get("z", 0)):
+            return False
+        if not all(_finite(payload.get(k, 0)) for k in ("font_pt", "volume")):
+            return False
+        if not all(isinstance(payload.get(k, ""), str) for k in _CLIP_STR_FIELDS):
+            return False
+        if not isinstance(node.get("child_board_id") or "", str):
+            return False
+    return True
+
 class MainWindow(QMainWindow):
+    CULL_MARGIN = 200   # px de escena alrededor del viewport
+    GRID_CELL = 512     # lado de celda del índice espacial
+    MRU_MAX = 12
+    BOARD_ITEMS_MAX = 4  # pizarras recientes cuyos items se conservan ocultos en la escena
+    JOURNAL_MAX = 500   # registros en el diario antes de compactar
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle(" ")
@@ -692,6 +1567,30 @@ class MainWindow(QMainWindow):
         self.back_stack: List[str] = []
         self.forward_stack: List[str] = []
         self.mru: List[str] = []
+        self.commands = CommandStack()
+
+        # Autosave diferido: se agrupan los cambios y sólo se reescriben las pizarras sucias
+        self._dirty_boards: Set[str] = set()
+        # Cambios sólo de notas (mover, redimensionar, texto): van al diario, no a la pizarra entera
+        self._dirty_notes: Dict[str, Set[str]] = {}
+        self._journaled: Set[str] = set()
+        self._journal_len = 0
+        self._saving: Optional[Set[str]] = None  # pizarras de la escritura en curso
+        self._saver = ProjectSaver(self)
+        self._saver.finished.connect(self._save_finished)
+        self._importer = AssetImporter(self)
+        self._importer.copied.connect(self._asset_copied)
+        # Copias que terminan juntas (soltar varios ficheros) se dan de alta en un solo bloque
+        self._imported: List[tuple] = []
+        self._import_timer = QTimer(self)
+        self._import_timer.setSingleShot(True)
+        self._import_timer.setInterval(0)
+        self._import_timer.timeout.connect(self._flush_imports)
+        self._batch: Optional[List[str]] = None
+        self._save_timer = QTimer(self)
+        self._save_timer.setSingleShot(True)
+        self._save_timer.setInterval(500)
+        self._save_timer.timeout.connect(self._flush_autosave)
 
         # Toolbar
         self.toolbar = QToolBar("Navegación")
@@ -706,6 +1605,14 @@ class MainWindow(QMainWindow):
         self.btn_history.setPopupMode(QToolButton.InstantPopup)
         self.menu_history = QMenu(self.btn_history)
         self.btn_history.setMenu(self.menu_history)
+        # Acciones fijas del historial: se reetiquetan en vez de recrearse
+        self._mru_actions: List[QAction] = []
+        for _ in range(self.MRU_MAX):
+            act = QAction(self)
+            act.setVisible(False)
+            act.triggered.connect(self._open_mru)
+            self.menu_history.addAction(act)
+            self._mru_actions.append(act)
         self.toolbar.addWidget(self.btn_history)
         self.breadcrumb = QLabel("Raíz")
         self.breadcrumb.setStyleSheet("font-weight:600; margin-left:12px;")
@@ -716,6 +1623,21 @@ class MainWindow(QMainWindow):
         self.view = BoardView(self.scene, self)
         self.setCentralWidget(self.view)
 
+        # Culling: sólo se materializan las notas cercanas al viewport
+        self._item_by_id: Dict[str, BaseNoteItem] = {}
+        self._shown_board_id: Optional[str] = None
+        self._board_items: "OrderedDict[str, Dict[str, BaseNoteItem]]" = OrderedDict()
+        self._order_index: Dict[str, int] = {}
+        self._cull_grid: Optional[Dict[Tuple[int, int], List[str]]] = None
+        self._geom: Optional[BoardGeometry] = None
+        self._cull_timer = QTimer(self)
+        self._cull_timer.setSingleShot(True)
+        self._cull_timer.setInterval(16)
+        self._cull_timer.timeout.connect(self._reconcile_viewport)
+        self.view.horizontalScrollBar().valueChanged.connect(self._schedule_reconcile)
+        self.view.verticalScrollBar().valueChanged.connect(self._schedule_reconcile)
+        self.view.viewport_resized.connect(self._schedule_reconcile)
+
         # Footer
         self.status = QStatusBar(self)
         self.setStatusBar(self.status)
@@ -724,13 +1646,15 @@ class MainWindow(QMainWindow):
         # Conexiones
         self.scene.request_new_idea.connect(self.create_idea_at)
         self.scene.request_new_texto.connect(self.create_texto_at)
-        self.scene.request_paste.connect(lambda p: self.paste_at(p))
+        self.scene.request_paste.connect(self.paste_at)
         self.view.dropped_files.connect(self.handle_dropped_files)
 
         # Shortcuts
         self.addAction(self._shortcut("Ctrl+X", self.cut_selected))
         self.addAction(self._shortcut("Ctrl+C", self.copy_selected))
         self.addAction(self._shortcut("Ctrl+V", lambda: self.paste_at(None)))
+        self.addAction(self._shortcut("Ctrl+Z", self.undo))
+        self.addAction(self._shortcut("Ctrl+Shift+Z", self.redo))
 
         self.refresh_board()
 
@@ -755,45 +1679,54 @@ class MainWindow(QMainWindow):
 
     # navegación
     def go_to_board(self, board_id: str, push_history: bool = True):
+        # El tecleo pendiente se registra en la pizarra que se deja, antes de cambiar de pizarra actual
+        self._commit_text_edits()
         if push_history and board_id != self.current_board_id:
             self.back_stack.append(self.current_board_id)
             self.forward_stack.clear()
         self.current_board_id = board_id
         self._push_mru(board_id)
         self.refresh_board()
-        self.autosave()
 
     def go_back(self):
         if not self.back_stack:
             return
+        self._commit_text_edits()
         prev = self.back_stack.pop()
         self.forward_stack.append(self.current_board_id)
         self.current_board_id = prev
         self._push_mru(prev)
         self.refresh_board()
-        self.autosave()
 
     def go_forward(self):
         if not self.forward_stack:
             return
+        self._commit_text_edits()
         nxt = self.forward_stack.pop()
         self.back_stack.append(self.current_board_id)
         self.current_board_id = nxt
         self._push_mru(nxt)
         self.refresh_board()
-        self.autosave()
 
     def _push_mru(self, bid: str):
         if bid in self.mru:
             self.mru.remove(bid)
         self.mru.insert(0, bid)
-        self.mru = self.mru[:12]
-        self.menu_history.clear()
-        for bid2 in self.mru:
-            title = self.project.boards.get(bid2, Board(bid2)).title or bid2[:6]
-            act = QAction(title, self)
-            act.triggered.connect(lambda _=False, b=bid2: self.go_to_board(b, True))
-            self.menu_history.addAction(act)
+        del self.mru[self.MRU_MAX:]
+        for i, act in enumerate(self._mru_actions):
+            if i < len(self.mru):
+                bid2 = self.mru[i]
+                b = self.project.boards.get(bid2)
+                act.setText((b.title if b else "") or bid2[:6])
+                act.setData(bid2)
+                act.setVisible(True)
+            else:
+                act.setVisible(False)
+
+    def _open_mru(self):
+        act = self.sender()
+        if isinstance(act, QAction) and act.data():
+            self.go_to_board(act.data(), True)
 
     def _update_breadcrumb(self):
         self.breadcrumb.setText("Raíz" if self.current_board_id == self.project.root_board_id else "… > (pizarra)")
@@ -801,41 +1734,226 @@ class MainWindow(QMainWindow):
     # escena
     def clear_scene(self):
         self.scene.clear()
+        self._item_by_id.clear()
+        self._board_items.clear()
+
+    def _switch_board_items(self):
+        # Los items de la pizarra que se deja se ocultan en vez de destruirse (sin redecodificar imágenes al volver)
+        prev = self._shown_board_id
+        self._commit_text_edits()
+        if prev is not None and self._item_by_id:
+            for it in self._item_by_id.values():
+                it.setVisible(False)
+            self._board_items[prev] = self._item_by_id
+        self._item_by_id = self._board_items.pop(self.current_board_id, {})
+        for it in self._item_by_id.values():
+            it.setVisible(True)
+        for bid in [bid for bid in self._board_items if bid not in self.project.boards]:
+            self._discard_board_items(bid)
+        while len(self._board_items) > self.BOARD_ITEMS_MAX:
+            self._discard_board_items(next(iter(self._board_items)))
+
+    def _discard_board_items(self, board_id: str):
+        for it in self._board_items.pop(board_id).values():
+            self.scene.removeItem(it)
 
     def refresh_board(self):
-        self.clear_scene()
         board = self.project.boards[self.current_board_id]
-        order = board.items_order or list(board.items.keys())
-        for nid in list(order):
+        if self._shown_board_id != self.current_board_id:
+            self._switch_board_items()
+            self._shown_board_id = self.current_board_id
+        self._order_index = {nid: i for i, nid in enumerate(board.items)}
+        self._invalidate_geometry()
+        # Diff contra lo ya materializado: se quita lo que sobra y se actualiza in situ el resto
+        for nid, it in list(self._item_by_id.items()):
             n = board.items.get(nid)
-            if not n:
-                try:
-                    order.remove(nid)
-                except Exception:
-                    pass
-                continue
-            item = self._create_item(n)
-            if item:
-                item.request_open_child.connect(lambda note_id=n.id: self.open_child_of_note(note_id))
-                item.request_delete.connect(lambda note_id=n.id: self.delete_note(note_id))
-                item.request_nest_into.connect(self.nest_note_into)
-                item.request_copy.connect(lambda note_id=n.id: self.copy_note(note_id))
-                item.request_cut.connect(lambda note_id=n.id: self.cut_note(note_id))
-                item.request_edit.connect(lambda note_id=n.id: self.edit_note(note_id))
-                item.request_dirty.connect(self.autosave)
+            if n is None or n is not it.note:
+                self._drop_item(nid)
+            else:
+                it.sync_from_note()
+        self._update_scene_rect(board)
+        self._reconcile_viewport()
         self._update_breadcrumb()
 
-    def _create_item(self, n: Note) -> Optional[BaseNoteItem]:
-        if n.type == "idea":
-            it = IdeaNoteItem(n)
-        elif n.type == "texto":
-            it = TextoNoteItem(n)
-        elif n.type == "image":
-            it = ImageNoteItem(n)
-        elif n.type == "audio":
-            it = AudioNoteItem(n)
+    def _sync_note(self, note_id: str):
+        self._sync_notes((note_id,))
+
+    def _sync_notes(self, note_ids: Iterable[str]):
+        # Índice de orden, geometría y reconciliación del viewport una sola vez para todo el grupo
+        board = self.project.boards[self.current_board_id]
+        sr = self.scene.sceneRect()
+        m = self.CULL_MARGIN
+        grown = False
+        for note_id in note_ids:
+            n = board.items.get(note_id)
+            it = self._item_by_id.get(note_id)
+            if it is not None and (n is None or n is not it.note):
+                self._drop_item(note_id)
+                it = None
+            if n is None:
+                continue
+            if it is not None:
+                it.sync_from_note()
+            nr = _note_rect(n).adjusted(-m, -m, m, m)
+            if not sr.contains(nr):
+                sr = sr.united(nr)
+                grown = True
+        self._order_index = {nid: i for i, nid in enumerate(board.items)}
+        self._invalidate_geometry()
+        if grown:
+            self.scene.setSceneRect(sr)
+        self._reconcile_viewport()
+
+    @contextmanager
+    def _batch_updates(self):
+        # Dentro del bloque los comandos sólo registran sus notas; la escena se sincroniza una vez al salir
+        if self._batch is not None:
+            yield
+            return
+        self._batch = []
+        try:
+            yield
+        finally:
+            notes, self._batch = self._batch, None
+            if notes and self.current_board_id in self.project.boards:
+                self._sync_notes(dict.fromkeys(notes))
+
+    def _drop_item(self, note_id: str):
+        it = self._item_by_id.pop(note_id, None)
+        if it is not None:
+            it.commit_text()
+            self.scene.removeItem(it)
+
+    def _commit_text_edits(self):
+        # El modelo se pone al día antes de leerlo (guardar, copiar, comandos)
+        for it in self._item_by_id.values():
+            it.commit_text()
+
+    def _update_scene_rect(self, board: Board):
+        # Los items no materializados no cuentan para el sceneRect automático
+        r = self._geometry(board).bounds()
+        m = self.CULL_MARGIN
+        self.scene.setSceneRect(r.adjusted(-m, -m, m, m) if not r.isNull() else QRectF())
+
+    def _schedule_reconcile(self, *_):
+        if not self._cull_timer.isActive():
+            self._cull_timer.start()
+
+    def _visible_rect(self) -> QRectF:
+        m = self.CULL_MARGIN
+        r = self.view.mapToScene(self.view.viewport().rect()).boundingRect()
+        return r.adjusted(-m, -m, m, m)
+
+    def _invalidate_geometry(self):
+        self._cull_grid = None
+        self._geom = None
+
+    def _geometry(self, board: Board) -> BoardGeometry:
+        # Compartida por sceneRect, rejilla de culling y hit-test de anidado
+        if self._geom is None:
+            self._geom = board_geometry(board, self._order_index)
+        return self._geom
+
+    def _idea_at(self, pos: QPointF, exclude: str = "") -> Optional[str]:
+        board = self.project.boards.get(self.current_board_id)
+        if board is None:
+            return None
+        g = self._geometry(board)
+        ids, x0, y0, x1, y1, idea = g.ids, g.x0, g.y0, g.x1, g.y1, g.idea
+        px, py = pos.x(), pos.y()
+        for i in range(len(ids) - 1, -1, -1):
+            if idea[i] and x0[i] <= px <= x1[i] and y0[i] <= py <= y1[i] and ids[i] != exclude:
+                return ids[i]
+        return None
+
+    def _note_dropped(self, note_id: str, pos: QPointF):
+        target = self._idea_at(pos, exclude=note_id)
+        if target:
+            self.nest_note_into(note_id, target)
+
+    def _build_cull_grid(self, board: Board) -> Dict[Tuple[int, int], List[str]]:
+        c = self.GRID_CELL
+        grid: Dict[Tuple[int, int], List[str]] = {}
+        g = self._geometry(board)
+        for nid, x0, y0, x1, y1 in zip(g.ids, g.x0, g.y0, g.x1, g.y1):
+            for gx in range(int(x0 // c), int(x1 // c) + 1):
+                for gy in range(int(y0 // c), int(y1 // c) + 1):
+                    grid.setdefault((gx, gy), []).append(nid)
+        return grid
+
+    def _cull_candidates(self, board: Board, rect: QRectF) -> List[str]:
+        if self._cull_grid is None:
+            self._cull_grid = self._build_cull_grid(board)
+        c = self.GRID_CELL
+        found = set()
+        for gx in range(int(rect.left() // c), int(rect.right() // c) + 1):
+            for gy in range(int(rect.top() // c), int(rect.bottom() // c) + 1):
+                found.update(self._cull_grid.get((gx, gy), ()))
+        return sorted(found, key=lambda nid: self._order_index.get(nid, 0))
+
+    def _reconcile_viewport(self):
+        board = self.project.boards.get(self.current_board_id)
+        if board is None:
+            return
+        visible = self._visible_rect()
+        for nid, it in list(self._item_by_id.items()):
+            if nid in board.items and (it.pinned() or visible.intersects(it.sceneBoundingRect())):
+                continue
+            self._drop_item(nid)
+        had_items = bool(self._item_by_id)
+        added = 0
+        # Alta en bloque: sin señales de la escena por cada addItem (el sceneRect ya está fijado)
+        self.scene.blockSignals(True)
+        try:
+            for nid in self._cull_candidates(board, visible):
+                n = board.items.get(nid)
+                if n is None or nid in self._item_by_id or not visible.intersects(_note_rect(n)):
+                    continue
+                if self._materialize(n):
+                    added += 1
+        finally:
+            self.scene.blockSignals(False)
+        if added and had_items:
+            self._restack()
+
+    def _restack(self):
+        # A igual z, Qt apila por orden de inserción: lo rehacemos según el orden de items
+        items = sorted(self._item_by_id.items(), key=lambda kv: self._order_index.get(kv[0], 0))
+        for (_a, lower), (_b, upper) in zip(items, items[1:]):
+            lower.stackBefore(upper)
+
+    def _materialize(self, n: Note) -> Optional[BaseNoteItem]:
+        item = self._create_item(n)
+        if item:
+            item.request_open_child.connect(self.open_child_of_note)
+            item.request_delete.connect(self.delete_note)
+            item.request_drop.connect(self._note_dropped)
+            item.request_copy.connect(self.copy_note)
+            item.request_cut.connect(self.cut_note)
+            item.request_edit.connect(self.edit_note)
+            item.request_dirty.connect(self._note_changed)
+            item.request_payload_edit.connect(self._payload_edited)
+            item.request_moved.connect(self._notes_moved)
+            self._item_by_id[n.id] = item
+        return item
+
+    def _note_changed(self):
+        it = self.sender()
+        if isinstance(it, BaseNoteItem):
+            self._invalidate_geometry()
+            sr = self.scene.sceneRect()
+            ir = it.sceneBoundingRect()
+            if not sr.contains(ir):
+                self.scene.setSceneRect(sr.united(ir))
+            self._mark_note_dirty(self.current_board_id, it.note.id)
         else:
+            self.autosave()
+
+    def _create_item(self, n: Note) -> Optional[BaseNoteItem]:
+        cls = _NOTE_ITEM_TYPES.get(n.type)
+        if cls is None:
             return None
+        it = cls(n)
         self.scene.addItem(it)
         return it
 
@@ -846,10 +1964,7 @@ class MainWindow(QMainWindow):
         note = Note(id=nid, type="idea", pos=(pos.x(), pos.y()), size=(260, 140))
         note.payload.title = "Idea"
         note.payload.subtitle = "Descripción…"
-        b.items[nid] = note
-        b.items_order.append(nid)
-        self.refresh_board()
-        self.autosave()
+        self._execute(self._add_note_command("Nueva idea", b.id, note))
 
     def create_texto_at(self, pos: QPointF):
         b = self.project.boards[self.current_board_id]
@@ -857,111 +1972,113 @@ class MainWindow(QMainWindow):
         note = Note(id=nid, type="texto", pos=(pos.x(), pos.y()), size=(300, 160))
         note.payload.body = "Escribe aquí…"
         note.payload.font_pt = 12
-        b.items[nid] = note
-        b.items_order.append(nid)
-        self.refresh_board()
-        self.autosave()
+        self._execute(self._add_note_command("Nuevo texto", b.id, note))
 
     # Drag & Drop desde el sistema
     def handle_dropped_files(self, files: List[str]):
         any_created = False
         for f in files:
             try:
-                ext = pathlib.Path(f).suffix.lower()
-                if ext in [".png", ".jpg", ".jpeg", ".gif", ".webp"]:
+                ext = os.path.splitext(f)[1].lower()
+                if ext in IMAGE_EXTS:
                     self._create_image_note_from(f)
                     any_created = True
-                elif ext in [".mp3", ".wav"]:
+                elif ext in AUDIO_EXTS:
                     self._create_audio_note_from(f)
                     any_created = True
             except Exception as e:
                 print("[dnd] error with", f, e)
         if any_created:
-            self.autosave()
-            self.status.showMessage("Recurso(s) añadido(s)", 1500)
+            self.status.showMessage("Copiando recurso(s)…", 1500)
         else:
             self.status.showMessage("Formato no soportado", 2000)
 
-    # Pegar (Ctrl+V): imagen > URLs > JSON de notas
+    # Pegar (Ctrl+V): URLs de imagen > imagen > JSON de notas
     def paste_at(self, pos: Optional[QPointF]):
+        self._commit_text_edits()
         cb = QGuiApplication.clipboard()
         md = cb.mimeData()
-        if md.hasImage():
-            img: QImage = md.imageData()
-            rel = save_qimage_into_assets(img, ".png")
-            if rel:
-                self._create_image_note_from_rel(rel, pos)
-                self.status.showMessage("Imagen pegada", 1500)
-                self.autosave()
-                return
+        # Un fichero local se copia tal cual: antes que reencodear a PNG el bitmap que lo acompaña
         if md.hasUrls():
             paths = [u.toLocalFile() for u in md.urls() if u.isLocalFile()]
             any_img = False
             for p in paths:
-                ext = pathlib.Path(p).suffix.lower()
-                if ext in [".png", ".jpg", ".jpeg", ".gif", ".webp"]:
+                if os.path.splitext(p)[1].lower() in IMAGE_EXTS:
                     self._create_image_note_from(p, pos)
                     any_img = True
             if any_img:
-                self.autosave()
                 self.status.showMessage("Imagen(es) pegada(s)", 1500)
                 return
-        clip = cb.text()
-        try:
-            data = json.loads(clip)
-            if isinstance(data, dict) and data.get("whiteboard_clip"):
-                self._paste_subtree(data["root"], self.current_board_id, pos)
-                self.refresh_board()
-                self.autosave()
+        if md.hasImage():
+            img: QImage = md.imageData()
+            rel = save_qimage_into_assets(img, ".png")
+            if rel:
+                self._create_image_note_from_rel(rel, pos)
+                self.status.showMessage("Imagen pegada", 1500)
+                return
+        # Pegar texto normal no paga un json_loads: decode_clip mira antes el prefijo
+        data = decode_clip(cb.text())
+        if isinstance(data, dict) and data.get("whiteboard_clip"):
+            nodes = data.get("nodes")
+            if nodes is None:
+                nodes = _flatten_clip_tree(data.get("root"))  # formato anidado anterior
+            # Un clip mal formado se rechaza entero antes de tocar el proyecto
+            if valid_clip_nodes(nodes):
+                self._paste_clip(nodes, pos)
                 return
-        except Exception:
-            pass
         self.status.showMessage("Nada que pegar aquí", 1200)
 
-    def _create_image_note_from_rel(self, rel: str, pos: Optional[QPointF]):
-        b = self.project.boards[self.current_board_id]
+    def _create_image_note_from_rel(self, rel: str, pos: Optional[QPointF], board_id: str = ""):
+        b = self.project.boards[board_id or self.current_board_id]
         nid = new_id()
         x, y = (pos.x(), pos.y()) if pos else (40, 40)
         note = Note(id=nid, type="image", pos=(x, y), size=(320, 220))
         note.payload.image_asset = rel
-        b.items[nid] = note
-        b.items_order.append(nid)
-        self.refresh_board()
+        self._execute(self._add_note_command("Imagen", b.id, note))
 
     def _create_image_note_from(self, src_path: str, pos: Optional[QPointF] = None):
-        rel = copy_into_assets(src_path)
-        if not rel:
-            self.status.showMessage("No se pudo copiar imagen", 2000)
-            return
-        self._create_image_note_from_rel(rel, pos)
+        # La nota se crea al terminar la copia, en la pizarra donde se soltó
+        self._importer.start("image", src_path, self.current_board_id, pos)
 
     def _create_audio_note_from(self, src_path: str):
-        rel = copy_into_assets(src_path)
-        if not rel:
-            self.status.showMessage("No se pudo copiar audio", 2000)
-            return
-        b = self.project.boards[self.current_board_id]
+        self._importer.start("audio", src_path, self.current_board_id)
+
+    def _create_audio_note_from_rel(self, rel: str, board_id: str):
+        b = self.project.boards[board_id]
         nid = new_id()
         note = Note(id=nid, type="audio", pos=(60, 60), size=(280, 120))
         note.payload.audio_asset = rel
         note.payload.volume = 100
-        b.items[nid] = note
-        b.items_order.append(nid)
-        self.refresh_board()
-        self.autosave()
+        self._execute(self._add_note_command("Audio", b.id, note))
+
+    def _asset_copied(self, kind: str, rel: str, board_id: str, pos):
+        self._imported.append((kind, rel, board_id, pos))
+        self._import_timer.start()
+
+    def _flush_imports(self):
+        done, self._imported = self._imported, []
+        added = False
+        with self._batch_updates():
+            for kind, rel, board_id, pos in done:
+                if board_id not in self.project.boards:
+                    continue  # la pizarra se borró mientras se copiaba
+                if not rel:
+                    self.status.showMessage("No se pudo copiar imagen" if kind == "image" else "No se pudo copiar audio", 2000)
+                    continue
+                if kind == "image":
+                    self._create_image_note_from_rel(rel, pos, board_id)
+                else:
+                    self._create_audio_note_from_rel(rel, board_id)
+                added = True
+        if added:
+            self.status.showMessage("Recurso(s) añadido(s)", 1500)
 
     def edit_note(self, note_id: str):
-        b = self.project.boards[self.current_board_id]
-        n = b.items.get(note_id)
-        if not n:
-            return
-        for it in self.scene.items():
-            if isinstance(it, IdeaNoteItem) and it.note.id == note_id:
-                it.title_item.setFocus()
-                return
-            if isinstance(it, TextoNoteItem) and it.note.id == note_id:
-                it.body_item.setFocus()
-                return
+        it = self._item_by_id.get(note_id)
+        if isinstance(it, IdeaNoteItem):
+            it.title_item.setFocus()
+        elif isinstance(it, TextoNoteItem):
+            it.body_item.setFocus()
 
     def open_child_of_note(self, note_id: str):
         b = self.project.boards[self.current_board_id]
@@ -972,6 +2089,7 @@ class MainWindow(QMainWindow):
             child_id = new_id()
             n.child_board_id = child_id
             self.project.boards[child_id] = Board(id=child_id, title=n.payload.title or "Sub-pizarra")
+            self._mark_dirty(self.current_board_id, child_id)
         self.go_to_board(n.child_board_id, push_history=True)
 
     def delete_note(self, note_id: str):
@@ -989,21 +2107,37 @@ class MainWindow(QMainWindow):
             )
             if reply == QMessageBox.No:
                 return
-            self._delete_board_recursive(n.child_board_id)
-        b.items.pop(note_id, None)
-        if note_id in b.items_order:
-            b.items_order.remove(note_id)
-        self.refresh_board()
-        self.autosave()
-
-    def _delete_board_recursive(self, board_id: str):
-        bd = self.project.boards.get(board_id)
-        if not bd:
-            return
-        for n in list(bd.items.values()):
-            if n.type == "idea" and n.child_board_id:
-                self._delete_board_recursive(n.child_board_id)
-        self.project.boards.pop(board_id, None)
+        child_id = n.child_board_id if n.type == "idea" else None
+        state = {"index": -1, "boards": {}}
+
+        def do():
+            if child_id:
+                state["boards"] = self._delete_board_recursive(child_id)
+            state["index"] = self._remove_note(b.id, note_id)
+
+        def undo():
+            self.project.boards.update(state["boards"])
+            self._mark_dirty(*state["boards"])
+            self._insert_note(b.id, n, state["index"])
+
+        self._execute(Command("Eliminar", do, undo, (b.id,), (note_id,)))
+
+    def _delete_board_recursive(self, board_id: str) -> Dict[str, Board]:
+        # DFS con pila explícita: primero se reúnen los ids y luego se borran de una pasada
+        to_delete: List[str] = []
+        seen = set()
+        stack = [board_id]
+        while stack:
+            bid = stack.pop()
+            bd = self.project.boards.get(bid)
+            if not bd or bid in seen:
+                continue
+            seen.add(bid)
+            to_delete.append(bid)
+            stack.extend(n.child_board_id for n in bd.items.values() if n.type == "idea" and n.child_board_id)
+        removed = {bid: self.project.boards.pop(bid) for bid in to_delete}
+        self._mark_dirty(*to_delete)
+        return removed
 
     def nest_note_into(self, dragged_id: str, target_id: str):
         if dragged_id == target_id:
@@ -1020,20 +2154,24 @@ class MainWindow(QMainWindow):
         child = self.project.boards[tgt.child_board_id]
         if dragged_id in child.items:
             return
-        b.items.pop(dragged_id, None)
-        if dragged_id in b.items_order:
-            b.items_order.remove(dragged_id)
-        src.pos = (40, 40)
-        child.items[dragged_id] = src
-        child.items_order.append(dragged_id)
-        self.refresh_board()
-        self.autosave()
+        old_pos = src.pos
+        state = {"index": -1}
+
+        def do():
+            state["index"] = self._remove_note(b.id, dragged_id)
+            src.pos = (40, 40)
+            self._insert_note(child.id, src)
+
+        def undo():
+            self._remove_note(child.id, dragged_id)
+            src.pos = old_pos
+            self._insert_note(b.id, src, state["index"])
+
+        self._execute(Command("Anidar", do, undo, (b.id, child.id), (dragged_id,)))
 
     def _selected_note_id(self) -> Optional[str]:
-        for it in self.scene.selectedItems():
-            if isinstance(it, BaseNoteItem):
-                return it.note.id
-        return None
+        it = next((it for it in self.scene.selectedItems() if isinstance(it, BaseNoteItem)), None)
+        return it.note.id if it is not None else None
 
     def copy_selected(self):
         sel = self._selected_note_id()
@@ -1046,86 +2184,296 @@ class MainWindow(QMainWindow):
             self.cut_note(sel)
 
     def copy_note(self, note_id: str):
+        self._commit_text_edits()
         b = self.project.boards[self.current_board_id]
         n = b.items.get(note_id)
         if not n:
             return
-        subtree = self._collect_subtree(n)
-        QGuiApplication.clipboard().setText(json.dumps({"whiteboard_clip": True, "root": subtree}))
+        QGuiApplication.clipboard().setMimeData(ClipMimeData(self._collect_subtree(n)))
 
     def cut_note(self, note_id: str):
         self.copy_note(note_id)
         self.delete_note(note_id)
 
-    def _collect_subtree(self, note: Note) -> dict:
-        node = {
-            "note": {
-                "type": note.type,
-                "size": note.size,
-                "z": note.z,
-                "payload": {
-                    "title": note.payload.title,
-                    "subtitle": note.payload.subtitle,
-                    "body": note.payload.body,
-                    "font_pt": note.payload.font_pt,
-                    "audio_asset": note.payload.audio_asset,
-                    "image_asset": note.payload.image_asset,
-                    "volume": note.payload.volume,
-                },
-            },
-            "children": [],
-        }
-        if note.type == "idea" and note.child_board_id:
-            b = self.project.boards[note.child_board_id]
-            for nid in b.items_order:
-                node["children"].append(self._collect_subtree(b.items[nid]))
-        return node
-
-    def _paste_subtree(self, node: dict, board_id: str, pos: Optional[QPointF]):
-        b = self.project.boards[board_id]
-        nid = new_id()
-        pld = node["note"]["payload"]
-        audio_asset = image_asset = ""
-        if pld.get("audio_asset"):
-            src = os.path.join(ASSETS_DIR, pld["audio_asset"])
-            if os.path.exists(src):
-                audio_asset = copy_into_assets(src)
-        if pld.get("image_asset"):
-            src = os.path.join(ASSETS_DIR, pld["image_asset"])
-            if os.path.exists(src):
-                image_asset = copy_into_assets(src)
-        n = Note(
+    def _collect_subtree(self, note: Note) -> List[dict]:
+        # Lista plana en preorden: cada nodo apunta al índice de su padre (-1 la raíz);
+        # los hijos se apilan al revés para conservar el orden
+        out: List[dict] = []
+        stack = [(note, -1)]
+        seen: Set[str] = set()  # cada sub-pizarra se recorre una vez (a prueba de ciclos)
+        while stack:
+            n, parent = stack.pop()
+            idx = len(out)
+            out.append({
+                "parent": parent,
+                "type": n.type,
+                "size": n.size,
+                "z": n.z,
+                "payload": payload_to_dict(n.payload),
+            })
+            if n.type == "idea" and n.child_board_id and n.child_board_id not in seen:
+                seen.add(n.child_board_id)
+                b = self.project.boards.get(n.child_board_id)
+                if b:
+                    stack.extend((b.items[nid], idx) for nid in reversed(b.items))
+        return out
+
+    def _paste_clip(self, nodes: List[dict], pos: Optional[QPointF]):
+        bid = self.current_board_id
+        boards = self._paste_subtree(nodes, bid, pos)
+        nid = next(reversed(self.project.boards[bid].items))
+        note = self.project.boards[bid].items[nid]
+
+        def do():
+            self.project.boards.update(boards)
+            self._insert_note(bid, note)
+
+        def undo():
+            self._remove_note(bid, nid)
+            for k in boards:
+                self.project.boards.pop(k, None)
+
+        # Ya aplicado por _paste_subtree: sólo se registra
+        cmd = Command("Pegar", do, undo, (bid, *boards), (nid,))
+        self.commands.push(cmd)
+        self._after_command(cmd)
+
+    def _paste_subtree(self, nodes: List[dict], board_id: str, pos: Optional[QPointF]) -> Dict[str, Board]:
+        # Una pasada lineal: en preorden el padre siempre precede a sus hijos
+        # Un único listado de assets por pegado en vez de un stat por nodo
+        with os.scandir(ASSETS_DIR) as it:
+            existing = {e.name for e in it}
+        # Ids de todo el pegado (notas y sub-pizarras de las ideas con hijos) generados de golpe
+        parents = {node["parent"] for node in nodes}
+        ids = iter(new_ids(len(nodes) + len(parents)))
+        child_of: Dict[int, str] = {-1: board_id}
+        # Las notas se acumulan por pizarra y se vuelcan de una vez al final
+        pending: Dict[str, List[Note]] = {board_id: []}
+        # Las sub-pizarras nuevas tampoco entran al proyecto hasta haber creado todo el subárbol
+        boards: Dict[str, Board] = {}
+        for i, node in enumerate(nodes):
+            bid = child_of.get(node["parent"])
+            if bid is None:
+                continue  # padre ausente o que no es idea
+            n = self._paste_node(node, next(ids), pos if i == 0 else None, existing)
+            pending[bid].append(n)
+            if n.type == "idea" and i in parents:
+                child_id = next(ids)
+                n.child_board_id = child_id
+                boards[child_id] = Board(id=child_id, title=n.payload.title or "Sub-pizarra")
+                pending[child_id] = []
+                child_of[i] = child_id
+        self.project.boards.update(boards)
+        for bid, notes in pending.items():
+            b = self.project.boards[bid]
+            b.items.update((n.id, n) for n in notes)
+        self._mark_dirty(*pending)
+        return boards
+
+    def _paste_node(self, node: dict, nid: str, pos: Optional[QPointF], existing: Set[str]) -> Note:
+        # Lookups resueltos una vez por nodo (las claves literales ya están internadas)
+        get = node["payload"].get
+        # Los assets ya están en ASSETS_DIR: se comparten por nombre, sin volver a copiarlos
+        audio_asset = get("audio_asset")
+        audio_asset = audio_asset if audio_asset in existing else ""
+        image_asset = get("image_asset")
+        image_asset = image_asset if image_asset in existing else ""
+        return Note(
             id=nid,
-            type=node["note"]["type"],
+            type=sys.intern(node["type"]),
             pos=(pos.x(), pos.y()) if pos else (60, 60),
-            size=tuple(node["note"].get("size", (260, 140))),
-            z=int(node["note"].get("z", 0)),
+            size=tuple(node.get("size", (260, 140))),
+            z=int(node.get("z", 0)),
             child_board_id=None,
             payload=NotePayload(
-                title=pld.get("title", ""),
-                subtitle=pld.get("subtitle", ""),
-                body=pld.get("body", ""),
-                font_pt=int(pld.get("font_pt", 12)),
+                title=get("title", ""),
+                subtitle=get("subtitle", ""),
+                body=get("body", ""),
+                font_pt=int(get("font_pt", 12)),
                 audio_asset=audio_asset,
                 image_asset=image_asset,
-                volume=int(pld.get("volume", 100)),
+                volume=int(get("volume", 100)),
             ),
         )
-        b.items[nid] = n
-        b.items_order.append(nid)
-        if n.type == "idea" and node.get("children"):
-            child_id = new_id()
-            n.child_board_id = child_id
-            self.project.boards[child_id] = Board(id=child_id, title=n.payload.title or "Sub-pizarra")
-            for ch in node["children"]:
-                self._paste_subtree(ch, child_id, None)
+
+    # deshacer / rehacer
+    def _insert_note(self, board_id: str, note: Note, index: int = -1):
+        items = self.project.boards[board_id].items
+        # Reinsertar en medio: se reencolan in situ las notas que iban detrás
+        tail = list(items)[index:] if 0 <= index < len(items) else []
+        items[note.id] = note
+        for nid in tail:
+            items[nid] = items.pop(nid)
+
+    def _remove_note(self, board_id: str, note_id: str) -> int:
+        items = self.project.boards[board_id].items
+        index = next((i for i, nid in enumerate(items) if nid == note_id), -1)
+        items.pop(note_id, None)
+        return index
+
+    def _add_note_command(self, label: str, board_id: str, note: Note) -> Command:
+        return Command(
+            label,
+            lambda: self._insert_note(board_id, note),
+            lambda: self._remove_note(board_id, note.id),
+            (board_id,),
+            (note.id,),
+        )
+
+    def _execute(self, cmd: Command):
+        self._commit_text_edits()
+        cmd.apply()
+        self.commands.push(cmd)
+        self._after_command(cmd)
+
+    def _after_command(self, cmd: Command):
+        self._mark_dirty(*cmd.boards)
+        if self.current_board_id not in self.project.boards:
+            # La pizarra visible ya no existe (p. ej. al rehacer el borrado de su idea)
+            self.back_stack = [b for b in self.back_stack if b in self.project.boards]
+            self.forward_stack = [b for b in self.forward_stack if b in self.project.boards]
+            self.current_board_id = self.project.root_board_id
+            self.refresh_board()
+        elif self.current_board_id not in cmd.boards:
+            return  # sólo cambiaron pizarras que no se ven
+        elif cmd.notes:
+            if self._batch is not None:
+                self._batch.extend(cmd.notes)
+            else:
+                self._sync_notes(cmd.notes)
+        else:
+            self.refresh_board()
+
+    def _payload_edited(self, note_id: str, old: dict, new: dict):
+        n = self.project.boards[self.current_board_id].items.get(note_id)
+        if n is None or old == new:
+            return
+
+        def setter(values: dict):
+            def apply():
+                for k, v in values.items():
+                    setattr(n.payload, k, v)
+            return apply
+
+        # La edición ya está aplicada en el item: sólo se registra (fusionando tecleo seguido)
+        self.commands.push(Command("Editar", setter(new), setter(old), (self.current_board_id,),
+                                   (note_id,), merge_key=f"edit:{note_id}"))
+
+    def _notes_moved(self, moved: list):
+        board = self.project.boards[self.current_board_id]
+
+        def setter(after: bool):
+            def apply():
+                for nid, before_geom, after_geom in moved:
+                    n = board.items.get(nid)
+                    if n is not None:
+                        n.pos, n.size = after_geom if after else before_geom
+            return apply
+
+        self.commands.push(Command("Mover", setter(True), setter(False), (board.id,),
+                                   tuple(nid for nid, _b, _a in moved)))
+
+    def undo(self):
+        self._commit_text_edits()
+        cmd = self.commands.undo()
+        if cmd:
+            self._after_command(cmd)
+            self.status.showMessage(f"Deshecho: {cmd.label}", 1200)
+
+    def redo(self):
+        self._commit_text_edits()
+        cmd = self.commands.redo()
+        if cmd:
+            self._after_command(cmd)
+            self.status.showMessage(f"Rehecho: {cmd.label}", 1200)
 
     def autosave(self):
-        try:
-            save_project(self.project, AUTOSAVE_JSON)
-            self.status.showMessage("Guardado", 800)
-        except Exception as e:
-            self.status.showMessage(f"Error guardando: {e}", 3000)
+        self._mark_dirty(self.current_board_id)
+
+    def _mark_dirty(self, *board_ids: str):
+        self._dirty_boards.update(board_ids)
+        for bid in board_ids:
+            self._dirty_notes.pop(bid, None)  # la pizarra entera ya las incluye
+        self._save_timer.start()
+
+    def _mark_note_dirty(self, board_id: str, note_id: str):
+        if board_id not in self._dirty_boards:
+            self._dirty_notes.setdefault(board_id, set()).add(note_id)
+        self._save_timer.start()
+
+    def _flush_autosave(self):
+        self._commit_text_edits()
+        self._save_timer.stop()
+        if not (self._dirty_boards or self._dirty_notes):
+            return
+        if self._saving is not None:
+            self._save_timer.start()  # escritura en curso: se reintenta después
+            return
+        records = []
+        for bid, nids in self._dirty_notes.items():
+            b = self.project.boards.get(bid)
+            if b is None:
+                continue
+            for nid in nids:
+                n = b.items.get(nid)
+                if n is not None:
+                    self.project.journal_seq += 1
+                    b.seq = self.project.journal_seq
+                    records.append({"seq": b.seq, "b": bid, "n": _note_to_dict(n)})
+            self._journaled.add(bid)
+        self._dirty_notes = {}
+        compact = self._journal_len + len(records) >= self.JOURNAL_MAX
+        if compact:
+            # Las pizarras con registros se reescriben enteras y el diario se vacía
+            self._dirty_boards |= self._journaled
+            self._journaled = set()
+            self._journal_len = 0
+            records = []
+        else:
+            self._journal_len += len(records)
+        full = self._dirty_boards
+        self._dirty_boards = set()
+        # Ante un error, todo lo enviado se reintenta como pizarra completa
+        self._saving = full | {r["b"] for r in records}
+        self._saver.start(snapshot_project(self.project, full, records, compact))
+
+    def _save_finished(self, error: str):
+        saved, self._saving = self._saving, None
+        if error:
+            self._dirty_boards |= saved or set()
+            self._save_status(SAVE_ERROR_MSG % error, 3000)
+        else:
+            self._save_status("Guardado", 800)
+        if self._dirty_boards or self._dirty_notes:
+            self._save_timer.start()
+
+    def _save_status(self, msg: str, ms: int):
+        # Guardados seguidos no repintan la barra si el mensaje ya está a la vista
+        if self.status.currentMessage() != msg:
+            self.status.showMessage(msg, ms)
+
+    def closeEvent(self, e):
+        # Copias en curso: se esperan y se entregan ya sus notas para que entren en el guardado final
+        self._importer.wait()
+        QCoreApplication.sendPostedEvents(self._importer, QEvent.MetaCall)
+        self._flush_imports()
+        self._commit_text_edits()
+        # Al salir Qt entrega el portapapeles al sistema: el JSON diferido se genera ahora, con Python vivo
+        cb = QGuiApplication.clipboard()
+        md = cb.mimeData()
+        if isinstance(md, ClipMimeData):
+            cb.setText(md.text())
+        self._save_timer.stop()
+        self._saver.wait()
+        # Se reintenta también lo último enviado (si ya está en disco, el digest lo descarta)
+        # y se compacta el diario reescribiendo las pizarras que tienen registros
+        pending = self._dirty_boards | (self._saving or set()) | self._journaled | set(self._dirty_notes)
+        if pending:
+            try:
+                save_project(self.project, pending, compact=True)
+            except SAVE_ERRORS as ex:
+                print("[save]", SAVE_ERROR_MSG % ex)
+        super().closeEvent(e)
 
 def main():
     QGuiApplication.setAttribute(Qt.AA_UseHighDpiPixmaps, True)
@@ -1133,7 +2481,7 @@ def main():
     set_app_icon(app)
     if QDARKSTYLE_OK:
         try:
-            app.setStyleSheet(qdarkstyle.load_stylesheet(qt_api="pyside6"))
+            app.setStyleSheet(dark_stylesheet(app))
         except Exception:
             pass
     w = MainWindow()
@@ -0,0 +1,26 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Antes de importar app: datos en un directorio temporal y Qt sin pantalla
+os.environ["APPDATA"] = tempfile.mkdtemp(prefix="pizarra-tests-")
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PySide6.QtWidgets import QApplication
+
+
+@pytest.fixture(scope="session")
+def qapp():
+    return QApplication.instance() or QApplication([])
+
+
+@pytest.fixture
+def window(qapp):
+    import app
+    w = app.MainWindow()
+    w.show()
+    yield w
+    w.close()
@@ -0,0 +1,45 @@
+import base64
+import json
+import zlib
+
+import app
+
+
+def _wrap(data: bytes) -> str:
+    return app.CLIP_ZPREFIX + base64.b64encode(data).decode("ascii")
+
+
+def test_large_clip_round_trip():
+    nodes = [{"parent": -1, "type": "texto", "size": [1, 1], "z": 0, "payload": {"body": "x" * app.CLIP_COMPRESS_MIN}}]
+    text = app.encode_clip(nodes)
+    assert text.startswith(app.CLIP_ZPREFIX)
+    assert app.decode_clip(text)["nodes"] == nodes
+
+
+def test_oversized_compressed_clip_is_rejected():
+    pad = b"0" * app.CLIP_MAX_BYTES
+    bomb = zlib.compress(b'{"whiteboard_clip": true, "nodes": [], "pad": "' + pad + b'"}', 9)
+    assert app.decode_clip(_wrap(bomb)) is None
+
+
+def test_corrupt_compressed_clip_is_rejected():
+    assert app.decode_clip(_wrap(b"not zlib at all")) is None
+    assert app.decode_clip(_wrap(zlib.compress(b'{"whiteboard_clip": true}')[:-4])) is None
+    assert app.decode_clip(app.CLIP_ZPREFIX + "%%%") is None
+
+
+def _node(**overrides):
+    node = {"parent": -1, "type": "texto", "size": [200, 100], "z": 0, "payload": {"body": "x"}}
+    node.update(overrides)
+    return node
+
+
+def test_valid_clip_nodes_rejects_non_finite_numbers():
+    assert app.valid_clip_nodes([_node()])
+    for bad in (float("nan"), float("inf"), float("-inf")):
+        assert not app.valid_clip_nodes([_node(size=[bad, 100])])
+        assert not app.valid_clip_nodes([_node(z=bad)])
+        assert not app.valid_clip_nodes([_node(payload={"font_pt": bad})])
+        assert not app.valid_clip_nodes([_node(payload={"volume": bad})])
+    # El json de la stdlib acepta los literales NaN/Infinity
+    assert not app.valid_clip_nodes(json.loads('[{"parent": -1, "type": "texto", "size": [NaN, 1], "payload": {}}]'))
@@ -0,0 +1,16 @@
+from PySide6.QtCore import QPointF
+
+
+def test_typing_then_navigating_is_undoable(window):
+    window.create_idea_at(QPointF(10, 10))
+    window.create_texto_at(QPointF(300, 10))
+    items = window.project.boards[window.current_board_id].items
+    idea_id, texto_id = list(items)
+    before = items[texto_id].payload.body
+    window._item_by_id[texto_id].body_item.setPlainText("hola")
+    window.open_child_of_note(idea_id)
+    assert window.commands.undo_stack[-1].label == "Editar"
+    window.go_back()
+    window.undo()
+    assert items[texto_id].payload.body == before
+    assert idea_id in items